@@ -35,6 +35,14 @@ mass = 1
 # spring coefficient
 spring_k = 8000
 
+# "implicit" runs diagonal-scaled gradient descent for num_substep iterations,
+# "newton" runs newton_iterations newton steps each solved by jacobi preconditioned cg
+solver = "implicit"
+newton_iterations = 3
+newton_tolerance = 1e-2
+cg_iterations = 200
+cg_tolerance = 1e-3
+
 
 """
 Below are Sphere setting
@@ -36,6 +36,11 @@ mass = total_mass / (n * n)
 # spring coefficient
 spring_k = 8000
 
+# constraint projection, "jacobi" or "gauss_seidel"
+# graph-colored gauss_seidel reaches the same stiffness with far fewer num_substep (~16)
+pbd_mode = "jacobi"
+pbd_stiffness = 1.0
+
 
 """
 Below are Sphere setting
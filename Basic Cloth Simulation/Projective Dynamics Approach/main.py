@@ -0,0 +1,27 @@
+import os
+import sys
+
+import metadata
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import cloth
+import cloth.viewer
+import headless
+
+# the prefactored sparse solver only runs on cpu (and cuda)
+args = headless.parse_args(metadata.window_name, default_arch="cpu")
+headless.init(args)
+
+config = cloth.ClothConfig.from_metadata(metadata, **headless.overrides(args))
+integrator = cloth.build(config, "pd")
+first_frame = headless.restore(args, integrator)
+
+profiler = headless.make_profiler(args, integrator)
+
+# simulation run
+if args.headless:
+    headless.run(integrator, args.frames, args.output, profiler,
+                 args.checkpoint, args.checkpoint_every, first_frame)
+else:
+    cloth.viewer.run_window(integrator, metadata.window_name, metadata.window_dimension, metadata.background_color,
+                            profiler)
@@ -0,0 +1,244 @@
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+import taichi as ti
+
+import cloth
+import headless
+
+"""
+Below is the benchmark of every cloth integrator on the same scenario
+"""
+# drape over a single sphere at the origin, shared by every solver so only dt and num_substep
+# (their stability setting) come from the metadata.py of the solver. The cloth is the same at every size:
+# its total mass is spread over the n x n vertices, spring_k of a grid spring is the stretch stiffness of
+# the sheet whatever its resolution, and damping is the velocity kept per simulated second
+scenario = {
+    "grid_length": 2,
+    "sphere_radius": 0.4,
+    "spheres": None,
+    "boxes": None,
+    "total_mass": 1.0,
+    "spring_k": 8000.0,
+    "damping_per_second": 0.7,
+}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the cloth integrators on the sphere drape scenario")
+    parser.add_argument("--solvers", nargs="+", choices=headless.solver_folder.keys(),
+                        default=list(headless.solver_folder.keys()),
+                        help="integrators to run")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[32, 64, 128, 256, 512, 1024],
+                        help="number of vertices per side of the cloth")
+    parser.add_argument("--arch", nargs="+", choices=headless.arch_table.keys(), default=["cpu"],
+                        help="taichi backends to run")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="max number of cpu threads, default to all cores")
+    parser.add_argument("--sim-time", type=float, default=0.5,
+                        help="simulated seconds of every run, the cloth touches the sphere after 0.3 s")
+    parser.add_argument("--max-seconds", type=float, default=60.0,
+                        help="stop a run early once its timed frames took this long, its sim_time is then shorter")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a ClothConfig field of every run, e.g. --set num_substep=16")
+    parser.add_argument("--output", type=str, default="benchmark.json",
+                        help="path of the .json file receiving the results")
+    parser.add_argument("--baseline", type=str, default=None,
+                        help="results of an earlier run, runs slower than it by more than --tolerance are reported "
+                             "and make the benchmark exit with status 1")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="relative slowdown of ms_per_frame tolerated against --baseline")
+    parser.add_argument("--plot", type=str, default=None,
+                        help="path of an image with the ms/frame scaling curves, needs matplotlib")
+    return parser.parse_args()
+
+
+def get_constraint_error(state: cloth.ClothState) -> (float, float):
+    """
+    Relative strain of the springs, |length - rest_length| / rest_length
+    :return: mean and max over every spring
+    """
+    x = state.x.to_numpy()
+    edges = state.edges.to_numpy()
+    i, j = edges["i"], edges["j"]
+    length = np.linalg.norm(x[i[:, 0], i[:, 1]] - x[j[:, 0], j[:, 1]], axis=1)
+    strain = np.abs(length - edges["rest_length"]) / edges["rest_length"]
+    return float(strain.mean()), float(strain.max())
+
+
+def get_scenario_values(n: int, dt: float) -> dict:
+    """
+    ClothConfig fields of the scenario for a cloth of n x n vertices stepped by dt, every integrator damps
+    the velocity once per step of dt
+    """
+    values = {name: scenario[name] for name in ("grid_length", "sphere_radius", "spheres", "boxes", "spring_k")}
+    values.update(n=n, mass=scenario["total_mass"] / (n * n), damping=scenario["damping_per_second"] ** dt)
+    return values
+
+
+def get_substeps_per_step(solver: str, config: cloth.ClothConfig) -> int:
+    """
+    Substeps run per step of dt: the explicit integrator advances dt once per substep, newton runs at most
+    newton_iterations newton steps, the other integrators iterate num_substep times
+    """
+    if solver == "explicit":
+        return 1
+    if solver == "newton":
+        return config.newton_iterations
+    return config.num_substep
+
+
+def run_case(solver: str, arch: str, n: int, args: argparse.Namespace) -> dict:
+    """
+    Simulate one solver at one cloth size on one backend
+    :return: record of the run, its setting and its measurements
+    """
+    if args.threads is None:
+        ti.init(arch=headless.arch_table[arch], offline_cache=False)
+    else:
+        ti.init(arch=headless.arch_table[arch], cpu_max_num_threads=args.threads, offline_cache=False)
+    actual_arch = ti.lang.impl.current_cfg().arch.name
+    record = {"solver": solver, "arch": arch, "actual_arch": actual_arch, "n": n}
+    if arch != "auto" and actual_arch != headless.arch_table[arch].name:
+        record["error"] = f"backend {arch} is not available"
+        return record
+
+    metadata = headless.load_metadata(solver)
+    settings = headless.parse_settings(args.set)
+    values = get_scenario_values(n, settings.get("dt", metadata.dt))
+    values.update(settings)
+    config = cloth.ClothConfig.from_metadata(metadata, **values)
+    record.update(dt=config.dt, num_substep=config.num_substep)
+
+    # the first frame includes kernel compilation, the extra time over a regular frame is the compile time
+    start_time = time.perf_counter()
+    integrator = cloth.build(config, solver)
+    ti.sync()
+    build_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    integrator.step()
+    ti.sync()
+    first_frame_time = time.perf_counter() - start_time
+
+    frame_times = []
+    sim_start = integrator.state.time
+    # at least one timed frame, e.g. when the first frame already reached sim_time
+    while not frame_times or (integrator.state.time < args.sim_time and sum(frame_times) < args.max_seconds):
+        start_time = time.perf_counter()
+        integrator.step()
+        ti.sync()
+        frame_times.append(time.perf_counter() - start_time)
+    total_time = sum(frame_times)
+    steps = round((integrator.state.time - sim_start) / config.dt)
+
+    mean_strain, max_strain = get_constraint_error(integrator.state)
+    record.update({
+        "frames": len(frame_times),
+        "sim_time": integrator.state.time,
+        "build_time": build_time,
+        "compile_time": max(first_frame_time - statistics.median(frame_times), 0.0),
+        "ms_per_frame": 1000 * total_time / len(frame_times),
+        "median_ms_per_frame": 1000 * statistics.median(frame_times),
+        "frames_per_second": len(frame_times) / total_time,
+        "substeps_per_second": steps * get_substeps_per_step(solver, config) / total_time,
+        "sim_seconds_per_second": (integrator.state.time - sim_start) / total_time,
+        "mean_strain": mean_strain,
+        "max_strain": max_strain,
+        "finite": bool(np.isfinite(integrator.state.x.to_numpy()).all()),
+    })
+    return record
+
+
+def compare(results: list, baseline: dict, tolerance: float) -> list:
+    """
+    :return: (record, baseline record) of every run slower than the baseline by more than tolerance
+    """
+    previous = {(r["solver"], r["arch"], r["n"]): r for r in baseline["results"] if "ms_per_frame" in r}
+    regressions = []
+    for record in results:
+        old = previous.get((record["solver"], record["arch"], record["n"]))
+        if old is not None and "ms_per_frame" in record and \
+                record["ms_per_frame"] > (1 + tolerance) * old["ms_per_frame"]:
+            regressions.append((record, old))
+    return regressions
+
+
+def import_pyplot():
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        raise RuntimeError("--plot requires the matplotlib package, pip install matplotlib") from None
+    return plt
+
+
+def plot(results: list, path: str):
+    plt = import_pyplot()
+    figure, axis = plt.subplots(figsize=(8, 5))
+    for solver, arch in sorted({(r["solver"], r["arch"]) for r in results}):
+        runs = sorted((r for r in results if (r["solver"], r["arch"]) == (solver, arch) and "ms_per_frame" in r),
+                      key=lambda r: r["n"])
+        axis.plot([r["n"] for r in runs], [r["ms_per_frame"] for r in runs], marker="o", label=f"{solver} ({arch})")
+    axis.set_xscale("log", base=2)
+    axis.set_yscale("log")
+    axis.set_xlabel("vertices per side")
+    axis.set_ylabel("ms / frame")
+    axis.legend()
+    figure.savefig(path, dpi=150, bbox_inches="tight")
+
+
+def main():
+    args = parse_args()
+    if args.plot is not None:
+        import_pyplot()     # fail before the runs when matplotlib is missing
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    results = []
+    print(f"{'solver':>9} {'arch':>7} {'n':>5} {'ms/frame':>10} {'frames/s':>10} {'substeps/s':>11} "
+          f"{'compile s':>10} {'mean strain':>12} {'max strain':>11} {'sim s':>6}")
+    for arch in args.arch:
+        for solver in args.solvers:
+            for n in args.sizes:
+                try:
+                    record = run_case(solver, arch, n, args)
+                except Exception as error:
+                    record = {"solver": solver, "arch": arch, "n": n, "error": f"{type(error).__name__}: {error}"}
+                results.append(record)
+                if "error" in record:
+                    print(f"{solver:>9} {arch:>7} {n:>5} {record['error']}")
+                else:
+                    print(f"{solver:>9} {arch:>7} {n:>5} {record['ms_per_frame']:>10.2f} "
+                          f"{record['frames_per_second']:>10.1f} {record['substeps_per_second']:>11.0f} "
+                          f"{record['compile_time']:>10.2f} "
+                          f"{record['mean_strain']:>12.2e} {record['max_strain']:>11.2e} {record['sim_time']:>6.2f}"
+                          + ("" if record["finite"] else "  diverged"))
+
+    environment = {"taichi": ".".join(str(k) for k in ti.__version__), "python": platform.python_version(),
+                   "platform": platform.platform(), "processor": platform.processor(), "scenario": scenario,
+                   "sim_time": args.sim_time, "set": args.set}
+    with open(args.output, "w") as file:
+        json.dump({"environment": environment, "results": results}, file, indent=2)
+    print(f"results written to {args.output}")
+    if args.plot is not None:
+        plot(results, args.plot)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for record, old in regressions:
+            print(f"regression: {record['solver']} {record['arch']} n={record['n']} "
+                  f"{old['ms_per_frame']:.2f} -> {record['ms_per_frame']:.2f} ms/frame")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+from .config import ClothConfig
+from .state import ClothState
+from .collision import ColliderSet
+from .spatial_hash import SpatialHash
+from .self_collision import SelfCollision
+from .chebyshev import ChebyshevAccelerator
+from .profiler import Profiler
+from .checkpoint import save_checkpoint, load_checkpoint, read_checkpoint
+from .integrators import Integrator, ExplicitIntegrator, ImplicitJacobiIntegrator, PBDIntegrator
+from .newton import ImplicitNewtonIntegrator
+from .projective import ProjectiveDynamicsIntegrator
+from .ensemble import EnsembleState, EnsembleExplicitIntegrator, build_ensemble
+
+integrator_table = {
+    "explicit": ExplicitIntegrator,
+    "implicit": ImplicitJacobiIntegrator,
+    "newton": ImplicitNewtonIntegrator,
+    "pbd": PBDIntegrator,
+    "pd": ProjectiveDynamicsIntegrator,
+}
+
+
+def build(config: ClothConfig, solver: str) -> Integrator:
+    """
+    Allocate cloth state, collider and the chosen integrator, then initialize the cloth
+    :param config: cloth simulation setting
+    :param solver: key of integrator_table
+    :return: integrator ready to step
+    """
+    state = ClothState(config.n, config.grid_length)
+    collider = ColliderSet.from_config(config)
+    integrator = integrator_table[solver](state, collider, config)
+    state.init_cloth()
+    return integrator
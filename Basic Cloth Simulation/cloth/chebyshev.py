@@ -0,0 +1,90 @@
+import taichi as ti
+
+from .config import ClothConfig
+
+
+@ti.data_oriented
+class ChebyshevAccelerator:
+    """
+    Chebyshev semi-iterative acceleration of a Jacobi style position update, following
+    Wang 2015 "A Chebyshev Semi-Iterative Approach for Accelerating Projective and Position-based Dynamics".
+    The wrapped iteration computes x_hat^{k+1} in place, which is then replaced by
+    x^{k+1} = omega_{k+1} * (gamma * (x_hat^{k+1} - x^k) + x^k - x^{k-1}) + x^{k-1}
+    """
+
+    def __init__(self, x: ti.MatrixField, config: ClothConfig):
+        self.x = x
+        self.gamma = config.chebyshev_gamma
+        self.delay = config.chebyshev_delay
+        self.report = config.chebyshev_report
+
+        # spectral radius, estimated from the first un-accelerated iterations when not given
+        self.rho = config.chebyshev_rho if config.chebyshev_rho > 0 else None
+        self.residuals = []     # residual of every iteration of the last run, filled when reporting
+
+        self.x_curr = ti.Vector.field(3, dtype=float, shape=x.shape)    # x^k
+        self.x_last = ti.Vector.field(3, dtype=float, shape=x.shape)    # x^{k-1}
+        self.residual = ti.field(dtype=float, shape=())
+
+    @ti.kernel
+    def restart(self):
+        """
+        Start a new run from x, x^{-1} = x^0 so the first accelerated iterate does not mix in the last run
+        """
+        for I in ti.grouped(self.x):
+            self.x_last[I] = self.x[I]
+
+    @ti.kernel
+    def save(self):
+        for I in ti.grouped(self.x):
+            self.x_curr[I] = self.x[I]
+
+    @ti.kernel
+    def accelerate(self, omega: float):
+        self.residual[None] = 0.0
+        for I in ti.grouped(self.x):
+            x_hat = self.x[I]
+            self.residual[None] += (x_hat - self.x_curr[I]).norm_sqr()
+            self.x[I] = omega * (self.gamma * (x_hat - self.x_curr[I]) + self.x_curr[I] - self.x_last[I]) + self.x_last[I]
+            self.x_last[I] = self.x_curr[I]
+
+    def estimate_rho(self, residuals: list) -> float:
+        """
+        Estimate spectral radius from the average convergence rate of the un-accelerated iterations
+        :return: estimated spectral radius, None when the residuals are degenerate (e.g. cloth at rest)
+        """
+        if len(residuals) < 2 or residuals[0] <= 0 or residuals[-1] <= 0:
+            return None
+        rho = (residuals[-1] / residuals[0]) ** (1 / (len(residuals) - 1))
+        return min(rho, 0.9999)
+
+    def run(self, iteration, num_iteration: int):
+        """
+        Run the wrapped iteration num_iteration times with chebyshev acceleration,
+        while the spectral radius is unknown the iterations are only under-relaxed
+        :param iteration: python callable running one Jacobi iteration on x in place
+        :param num_iteration: number of iterations
+        """
+        self.restart()
+        self.residuals = []
+        estimating = self.rho is None
+        warmup = []
+        omega = 1.0
+        for k in range(num_iteration):
+            if k < self.delay or self.rho is None:
+                omega = 1.0
+            elif k == self.delay:
+                omega = 2 / (2 - self.rho * self.rho)
+            else:
+                omega = 4 / (4 - self.rho * self.rho * omega)
+
+            self.save()
+            iteration()
+            self.accelerate(omega)
+
+            if estimating and k < self.delay:
+                warmup.append(self.residual[None] ** 0.5)
+                if k == self.delay - 1:
+                    self.rho = self.estimate_rho(warmup)
+            if self.report:
+                self.residuals.append(self.residual[None] ** 0.5)
@@ -0,0 +1,122 @@
+import dataclasses
+import json
+import os
+import struct
+
+import numpy as np
+import taichi as ti
+
+# file layout: magic, version and header length, the json header padded to ALIGNMENT bytes,
+# then the raw arrays of the fields at the offsets listed in the header
+MAGIC = b"CLOTHCKP"
+VERSION = 1
+ALIGNMENT = 64
+PREFIX = struct.Struct("<8sII")
+
+# fields of the state carried from one frame to the next, the buffers of the integrators (x_hat, x_prev,
+# sum_x, ...) are rewritten from them at the start of every step and are not stored
+state_fields = ("x", "v")
+
+
+def align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def get_config(integrator) -> dict:
+    """
+    Setting of the integrator as stored in the header, vectors become lists
+    """
+    values = dataclasses.asdict(integrator.config)
+    return json.loads(json.dumps(values, default=lambda value: [float(k) for k in value]))
+
+
+def save_checkpoint(path: str, integrator, frame: int = 0):
+    """
+    Write the state of the integrator to a snapshot file, the fields are copied with one to_numpy each
+    into a memory-mapped file. The file is written next to path and renamed over it once complete, so a
+    run killed while saving keeps its previous snapshot
+    :param path: snapshot file
+    :param integrator: any cloth integrator, or an ensemble one
+    :param frame: frames simulated so far, stored for the resumed run
+    """
+    state = integrator.state
+    arrays = {name: getattr(state, name).to_numpy() for name in state_fields}
+    accelerator = getattr(integrator, "accelerator", None)
+
+    fields, offset = {}, 0
+    for name, array in arrays.items():
+        fields[name] = {"dtype": array.dtype.str, "shape": array.shape, "offset": offset}
+        offset = align(offset + array.nbytes)
+    header = {
+        "integrator": type(integrator).__name__,
+        "n": state.n,
+        "time": state.time,
+        "frame": frame,
+        "config": get_config(integrator),
+        # spectral radius estimated by the chebyshev accelerator, reused instead of estimated again
+        "chebyshev_rho": accelerator.rho if accelerator is not None else None,
+        "fields": fields,
+    }
+    text = json.dumps(header).encode()
+    data_start = align(PREFIX.size + len(text))
+
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(PREFIX.pack(MAGIC, VERSION, len(text)))
+        file.write(text)
+        file.truncate(data_start + offset)
+    for name, array in arrays.items():
+        target = np.memmap(temporary, dtype=array.dtype, mode="r+", offset=data_start + fields[name]["offset"],
+                           shape=array.shape)
+        target[...] = array
+        target.flush()
+        del target
+    os.replace(temporary, path)
+
+
+def read_checkpoint(path: str) -> (dict, dict):
+    """
+    Map a snapshot file without reading it
+    :return: header of the snapshot and a read-only memmap of every stored field
+    """
+    with open(path, "rb") as file:
+        magic, version, length = PREFIX.unpack(file.read(PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a cloth checkpoint")
+        if version != VERSION:
+            raise ValueError(f"{path} has checkpoint version {version}, expected {VERSION}")
+        header = json.loads(file.read(length))
+    data_start = align(PREFIX.size + length)
+    arrays = {name: np.memmap(path, dtype=np.dtype(field["dtype"]), mode="r", offset=data_start + field["offset"],
+                              shape=tuple(field["shape"]))
+              for name, field in header["fields"].items()}
+    return header, arrays
+
+
+def load_checkpoint(path: str, integrator) -> dict:
+    """
+    Restore a snapshot into the state of the integrator, with one from_numpy per field. The snapshot may come
+    from another integrator, e.g. a settled cloth reused as the warm start of every run of a sweep
+    :param path: snapshot file written by save_checkpoint
+    :param integrator: cloth integrator with the same cloth size as the snapshot
+    :return: header of the snapshot
+    """
+    header, arrays = read_checkpoint(path)
+    state = integrator.state
+    for name in state_fields:
+        field = getattr(state, name)
+        if arrays[name].shape != field.shape + (3,):
+            raise ValueError(f"checkpoint {name} has shape {arrays[name].shape}, "
+                             f"the cloth expects {field.shape + (3,)}")
+    for name in state_fields:
+        field = getattr(state, name)
+        field.from_numpy(np.ascontiguousarray(arrays[name], dtype=ti.lang.util.to_numpy_type(field.dtype)))
+    state.time = header["time"]
+
+    # the estimated spectral radius only holds for the same integrator and setting, i.e. when resuming
+    accelerator = getattr(integrator, "accelerator", None)
+    if accelerator is not None and accelerator.rho is None and header["integrator"] == type(integrator).__name__ \
+            and header["config"] == get_config(integrator):
+        accelerator.rho = header["chebyshev_rho"]
+    ti.sync()
+    return header
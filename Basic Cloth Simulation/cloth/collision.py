@@ -0,0 +1,234 @@
+import numpy as np
+import taichi as ti
+import taichi.math as tm
+
+from .config import ClothConfig
+
+# distance a swept vertex is left away from the surface, so the next sweep does not start inside the collider
+ccd_skin = 1e-4
+
+
+@ti.func
+def sphere_distance(p: tm.vec3, center: tm.vec3, radius: float):
+    """
+    Signed distance from p to a sphere and its outward normal
+    """
+    vertex2sphere = p - center
+    return vertex2sphere.norm() - radius, vertex2sphere.normalized()
+
+
+@ti.func
+def friction(v: tm.vec3, normal: tm.vec3, mu_T: float, mu_N: float) -> tm.vec3:
+    """
+    Velocity after a frictional impulse against a surface of the given normal
+    :param mu_T: tangential friction coefficient
+    :param mu_N: normal restitution coefficient
+    """
+    result = v
+    if v.dot(normal) < 0:
+        vn = v.dot(normal) * normal
+        vt = v - vn
+        alpha = max(0, 1 - mu_T * (1 + mu_N) * vn.norm() / vt.norm())
+        result = -mu_N * vn + alpha * vt
+    return result
+
+
+@ti.func
+def respond(x: tm.vec3, v: tm.vec3, dist: float, normal: tm.vec3, mu_T: float, mu_N: float):
+    """
+    Impulse response of a vertex at signed distance dist <= 0 from a surface
+    :return: position pushed back to the surface and velocity after the frictional impulse
+    """
+    return x - dist * normal, friction(v, normal, mu_T, mu_N)
+
+
+@ti.data_oriented
+class ColliderSet:
+    """
+    Static spheres and axis aligned boxes the cloth collides with
+    """
+
+    def __init__(self, spheres: list, boxes: list, mu_T: float, mu_N: float):
+        """
+        :param spheres: list of (center, radius)
+        :param boxes: list of (center, half_size)
+        :param mu_T: tangential friction coefficient
+        :param mu_N: normal restitution coefficient
+        """
+        self.mu_T = mu_T
+        self.mu_N = mu_N
+        # number of vertices pushed out or stopped, only counted when profiling since the atomic add slows
+        # the collision kernels down, set count_contacts before their first call
+        self.count_contacts = False
+        self.num_contacts = ti.field(dtype=ti.i32, shape=())
+        self.num_spheres = len(spheres)
+        self.num_boxes = len(boxes)
+
+        # taichi does not allow empty fields, unused slots are never visited
+        self.sphere_center = ti.Vector.field(3, dtype=float, shape=max(self.num_spheres, 1))
+        self.sphere_radius = ti.field(dtype=float, shape=max(self.num_spheres, 1))
+        self.box_center = ti.Vector.field(3, dtype=float, shape=max(self.num_boxes, 1))
+        self.box_half_size = ti.Vector.field(3, dtype=float, shape=max(self.num_boxes, 1))
+
+        if self.num_spheres > 0:
+            self.sphere_center.from_numpy(np.array([center for center, radius in spheres], dtype=np.float32))
+            self.sphere_radius.from_numpy(np.array([radius for center, radius in spheres], dtype=np.float32))
+        if self.num_boxes > 0:
+            self.box_center.from_numpy(np.array([center for center, half_size in boxes], dtype=np.float32))
+            self.box_half_size.from_numpy(np.array([half_size for center, half_size in boxes], dtype=np.float32))
+
+    @staticmethod
+    def from_config(config: ClothConfig) -> "ColliderSet":
+        """
+        Colliders listed in config, a single sphere of sphere_radius at the origin when none is given
+        """
+        spheres = config.spheres
+        if spheres is None:
+            spheres = [((0, 0, 0), config.sphere_radius)]
+        return ColliderSet(spheres, config.boxes or [], config.mu_T, config.mu_N)
+
+    @ti.func
+    def signed_distance(self, p: tm.vec3):
+        """
+        Signed distance to the nearest collider and its outward normal, distance is 1e9 when there is no collider
+        """
+        dist = 1e9
+        normal = tm.vec3(0.0, 1.0, 0.0)
+        for k in range(self.num_spheres):
+            curr_dist, curr_normal = sphere_distance(p, self.sphere_center[k], self.sphere_radius[k])
+            if curr_dist < dist:
+                dist = curr_dist
+                normal = curr_normal
+
+        for k in range(self.num_boxes):
+            vertex2box = p - self.box_center[k]
+            q = abs(vertex2box) - self.box_half_size[k]
+            outside = max(q, 0.0).norm()
+            curr_dist = outside + min(max(q.x, q.y, q.z), 0.0)
+            if curr_dist < dist:
+                dist = curr_dist
+                if outside > 0:
+                    normal = tm.sign(vertex2box) * max(q, 0.0) / outside
+                else:
+                    # leave through the closest face
+                    axis = 0
+                    if q.y >= q.x and q.y >= q.z:
+                        axis = 1
+                    elif q.z >= q.x and q.z >= q.y:
+                        axis = 2
+                    normal = tm.vec3(0.0)
+                    normal[axis] = tm.sign(vertex2box[axis])
+        return dist, normal
+
+    @ti.func
+    def time_of_impact(self, p0: tm.vec3, p1: tm.vec3):
+        """
+        First time in [0, 1] the segment p0 -> p1 enters a collider and the outward normal at the hit point.
+        Time is 2 when the segment misses every collider and -1 when p0 is already inside one
+        """
+        toi = 2.0
+        normal = tm.vec3(0.0, 1.0, 0.0)
+        d = p1 - p0
+        a = d.dot(d)
+        for k in range(self.num_spheres):
+            oc = p0 - self.sphere_center[k]
+            radius = self.sphere_radius[k]
+            b = oc.dot(d)
+            c = oc.dot(oc) - radius * radius
+            if c <= 0:
+                toi = -1.0
+                normal = oc.normalized()
+            elif a > 0 and b < 0:
+                disc = b * b - a * c
+                if disc >= 0:
+                    t = (-b - ti.sqrt(disc)) / a
+                    if t <= 1 and t < toi and toi >= 0:
+                        toi = t
+                        normal = (oc + t * d) / radius
+
+        for k in range(self.num_boxes):
+            # slab test, the entry time is the largest of the per axis entry times
+            o = p0 - self.box_center[k]
+            h = self.box_half_size[k]
+            t_near, t_far = -1e9, 1e9
+            axis = 0
+            for m in ti.static(range(3)):
+                if d[m] != 0:
+                    t0, t1 = (-h[m] - o[m]) / d[m], (h[m] - o[m]) / d[m]
+                    if min(t0, t1) > t_near:
+                        t_near = min(t0, t1)
+                        axis = m
+                    t_far = min(t_far, max(t0, t1))
+                elif abs(o[m]) > h[m]:
+                    t_far = -1.0
+            if (abs(o) <= h).all():
+                toi = -1.0
+            elif t_near <= t_far and 0 <= t_near <= 1 and t_near < toi and toi >= 0:
+                toi = t_near
+                normal = tm.vec3(0.0)
+                normal[axis] = -tm.sign(d[axis])
+        return toi, normal
+
+    @ti.func
+    def add_contact(self):
+        if ti.static(self.count_contacts):
+            self.num_contacts[None] += 1
+
+    @ti.kernel
+    def handle_collision(self, state: ti.template()):
+        """
+        Push penetrating vertices back to the surface and apply a frictional impulse to their velocity
+        """
+        for i, j in state.x:
+            dist, normal = self.signed_distance(state.x[i, j])
+            if dist <= 0:
+                # impulse approach
+                self.add_contact()
+                state.x[i, j], state.v[i, j] = respond(state.x[i, j], state.v[i, j], dist, normal, self.mu_T, self.mu_N)
+
+    @ti.kernel
+    def sweep(self, state: ti.template(), x_prev: ti.template()):
+        """
+        Continuous collision, sweep every vertex from x_prev to its current position and stop it at the
+        time of impact with a frictional impulse. Thin colliders can not be tunneled through however
+        large the step, vertices that started inside a collider fall back to the discrete push out
+        """
+        for i, j in state.x:
+            toi, normal = self.time_of_impact(x_prev[i, j], state.x[i, j])
+            if toi < 0:
+                dist, inside_normal = self.signed_distance(state.x[i, j])
+                if dist <= 0:
+                    self.add_contact()
+                    state.x[i, j], state.v[i, j] = respond(state.x[i, j], state.v[i, j], dist, inside_normal,
+                                                           self.mu_T, self.mu_N)
+            elif toi <= 1:
+                self.add_contact()
+                state.x[i, j] = x_prev[i, j] + toi * (state.x[i, j] - x_prev[i, j]) + ccd_skin * normal
+                state.v[i, j] = friction(state.v[i, j], normal, self.mu_T, self.mu_N)
+
+    @ti.kernel
+    def push_out(self, x: ti.template(), x_prev: ti.template()):
+        """
+        Push penetrating positions of x back to the surface without touching any velocity.
+        The surface point is the one nearest to x_prev, the non penetrating position at the start of the
+        step, so vertices dragged deep into a collider by a large step do not come out of the opposite side
+        """
+        for I in ti.grouped(x):
+            dist, normal = self.signed_distance(x[I])
+            if dist <= 0:
+                self.add_contact()
+                prev_dist, prev_normal = self.signed_distance(x_prev[I])
+                x[I] = x_prev[I] - prev_dist * prev_normal
+
+    @ti.kernel
+    def project(self, state: ti.template(), dt: float):
+        """
+        Push penetrating vertices back to the surface and set the velocity to the applied displacement
+        """
+        for i, j in state.x:
+            dist, normal = self.signed_distance(state.x[i, j])
+            if dist <= 0:
+                self.add_contact()
+                target_x = state.x[i, j] - dist * normal
+                state.v[i, j] = 1 / dt * (target_x - state.x[i, j])
+                state.x[i, j] = target_x
@@ -0,0 +1,89 @@
+import dataclasses
+
+import taichi.math as tm
+
+
+@dataclasses.dataclass
+class ClothConfig:
+    """
+    Physical and cloth setting shared by every integrator, normally built from a metadata.py module
+    """
+    # physical setting
+    dt:            float
+    num_substep:   int
+    damping:       float
+    gravity:       tm.vec3
+    mu_T:          float
+    mu_N:          float
+
+    # cloth setting
+    n:             int
+    grid_length:   float
+    mass:          float
+    spring_k:      float
+
+    # sphere setting
+    sphere_radius: float
+
+    # collider setting, list of (center, radius) and (center, half_size),
+    # a single sphere of sphere_radius at the origin when spheres is None
+    spheres:             list = None
+    boxes:               list = None
+
+    # continuous collision, sweep every vertex over the step against the colliders instead of
+    # pushing out penetrations after it, lets dt grow without tunneling
+    ccd:                 bool = False
+
+    # self collision, thickness <= 0 defaults to half of grid_interval
+    self_collision:      bool = False
+    collision_thickness: float = 0.0
+
+    # pbd setting, "jacobi" or "gauss_seidel" constraint projection
+    pbd_mode:      str = "jacobi"
+    pbd_stiffness: float = 1.0
+
+    # newton setting, tolerances are relative to the gradient norm at the start of the step / newton step
+    newton_iterations: int = 3
+    newton_tolerance:  float = 1e-2
+    cg_iterations:     int = 200
+    cg_tolerance:      float = 1e-3
+
+    # chebyshev acceleration of the jacobi iterations, chebyshev_rho <= 0 estimates the spectral radius
+    chebyshev:         bool = False
+    chebyshev_rho:     float = 0.0
+    chebyshev_gamma:   float = 0.9
+    chebyshev_delay:   int = 10
+    chebyshev_report:  bool = False
+
+    @property
+    def grid_interval(self) -> float:
+        return self.grid_length / self.n
+
+    @property
+    def t_inverse(self) -> float:
+        return 1 / (self.dt * self.dt)
+
+    @staticmethod
+    def from_metadata(metadata, **overrides) -> "ClothConfig":
+        """
+        Build config from the constants of a metadata.py module
+        :param metadata: imported metadata module
+        :param overrides: field values replacing the metadata ones, None values are ignored
+        :return: config of the cloth simulation
+        """
+        names = {field.name for field in dataclasses.fields(ClothConfig)}
+        unknown = set(overrides) - names
+        if unknown:
+            raise ValueError(f"unknown ClothConfig fields {sorted(unknown)}")
+
+        values = {}
+        for field in dataclasses.fields(ClothConfig):
+            if overrides.get(field.name) is not None:
+                values[field.name] = overrides[field.name]
+            elif hasattr(metadata, field.name):
+                values[field.name] = getattr(metadata, field.name)
+
+        # metadata that define total_mass spread it over the vertices
+        if overrides.get("mass") is None and hasattr(metadata, "total_mass"):
+            values["mass"] = metadata.total_mass / (values["n"] * values["n"])
+        return ClothConfig(**values)
@@ -0,0 +1,47 @@
+import numpy as np
+import taichi as ti
+import taichi.math as tm
+
+# half of the 8-neighbour stencil, the other half is the same springs seen from the other vertex
+structural_offset = [(1, 0), (0, 1)]
+shear_offset = [(1, 1), (1, -1)]
+
+
+@ti.dataclass
+class Edge:
+    i:           tm.ivec2    # grid index of first vertex
+    j:           tm.ivec2    # grid index of second vertex
+    rest_length: float
+
+
+def build_grid_edges(n: int, grid_interval: float) -> (dict, list):
+    """
+    List every structural and shear spring of a n x n grid exactly once, grouped by color.
+    Springs of the same color share no vertex, so a color batch can be projected in parallel
+    :param n: number of vertices per side
+    :param grid_interval: distance between two adjacent vertices
+    :return: numpy arrays keyed by Edge member, ready for Edge.field().from_numpy,
+             and the (begin, end) range of every color batch
+    """
+    row, col = np.meshgrid(np.arange(n), np.arange(n), indexing="ij")
+    edge_i, edge_j, rest_length, batches = [], [], [], []
+    num_edges = 0
+    for offset in structural_offset + shear_offset:
+        nrow, ncol = row + offset[0], col + offset[1]
+        valid = (0 <= nrow) & (nrow < n) & (0 <= ncol) & (ncol < n)
+        # springs along one offset only touch each other when they start on rows/cols of different parity
+        parity = (row if offset[0] != 0 else col) % 2
+        for color in range(2):
+            mask = valid & (parity == color)
+            edge_i.append(np.stack([row[mask], col[mask]], axis=-1))
+            edge_j.append(np.stack([nrow[mask], ncol[mask]], axis=-1))
+            rest_length.append(np.full(mask.sum(), np.linalg.norm(offset) * grid_interval))
+            batches.append((num_edges, num_edges + int(mask.sum())))
+            num_edges += int(mask.sum())
+
+    edges = {
+        "i": np.concatenate(edge_i).astype(np.int32),
+        "j": np.concatenate(edge_j).astype(np.int32),
+        "rest_length": np.concatenate(rest_length).astype(np.float32),
+    }
+    return edges, batches
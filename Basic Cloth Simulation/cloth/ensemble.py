@@ -0,0 +1,141 @@
+import numpy as np
+import taichi as ti
+import taichi.math as tm
+
+from .collision import respond, sphere_distance
+from .config import ClothConfig
+from .edges import Edge, build_grid_edges
+
+# ClothConfig fields that can differ between the instances of an ensemble
+instance_fields = ("spring_k", "damping", "mu_T", "mu_N", "sphere_radius")
+
+
+@ti.dataclass
+class InstanceParams:
+    spring_k:      float
+    damping:       float
+    mu_T:          float
+    mu_N:          float
+    sphere_radius: float
+
+
+@ti.data_oriented
+class EnsembleState:
+    """
+    batch independent n x n cloths sharing the same springs, x and v have a leading batch dimension
+    so one kernel launch advances all of them
+    """
+
+    def __init__(self, batch: int, n: int, grid_length: float, height: float = 0.8):
+        self.batch = batch
+        self.n = n
+        self.grid_length = grid_length
+        self.grid_interval = grid_length / n
+        self.height = height
+        self.time = 0.0
+
+        self.x = ti.Vector.field(3, dtype=float, shape=(batch, n, n))
+        self.v = ti.Vector.field(3, dtype=float, shape=(batch, n, n))
+
+        # the topology is the same for every instance, store the springs once
+        edges, self.edge_batches = build_grid_edges(n, self.grid_interval)
+        self.num_edges = len(edges["rest_length"])
+        self.edges = Edge.field(shape=self.num_edges)
+        self.edges.from_numpy(edges)
+
+    @ti.kernel
+    def init_cloth(self):
+        for b, i, j in self.x:
+            self.x[b, i, j] = [i * self.grid_interval - 0.5 * self.grid_length,
+                               self.height,
+                               j * self.grid_interval - 0.5 * self.grid_length]
+            self.v[b, i, j] = [0, 0, 0]
+
+
+@ti.data_oriented
+class EnsembleExplicitIntegrator:
+    """
+    Explicit Euler step of ExplicitIntegrator over every instance of an EnsembleState at once, each instance
+    with its own spring_k, damping, friction and radius of the sphere at the origin it drapes over
+    """
+
+    def __init__(self, state: EnsembleState, config: ClothConfig, params: dict):
+        """
+        :param state: cloths of the ensemble
+        :param config: setting shared by every instance
+        :param params: (batch,) array of every field of instance_fields
+        """
+        self.state = state
+        self.config = config
+        batch, n = state.batch, state.n
+        self.params = InstanceParams.field(shape=batch)
+        self.params.from_numpy({name: np.asarray(params[name], dtype=np.float32) for name in instance_fields})
+        self.force = ti.Vector.field(3, dtype=float, shape=(batch, n, n))
+
+    @ti.kernel
+    def compute_force(self):
+        x, force = ti.static(self.state.x, self.force)
+        for b, i, j in force:
+            force[b, i, j] = self.config.mass * self.config.gravity
+
+        for b, e in ti.ndrange(self.state.batch, self.state.num_edges):
+            edge = self.state.edges[e]
+            I, J = tm.ivec3(b, edge.i), tm.ivec3(b, edge.j)
+            x_diff = x[I] - x[J]
+            # spring force
+            spring = -self.params[b].spring_k * (x_diff.norm() - edge.rest_length) * x_diff.normalized()
+            force[I] += spring
+            force[J] -= spring
+
+    @ti.kernel
+    def explicit_update(self):
+        x, v = ti.static(self.state.x, self.state.v)
+        dt = ti.static(self.config.dt)
+        for b, i, j in v:
+            v[b, i, j] *= self.params[b].damping
+            v[b, i, j] += self.force[b, i, j] * dt / self.config.mass
+            x[b, i, j] += v[b, i, j] * dt
+
+    @ti.kernel
+    def handle_collision(self):
+        """
+        Push the vertices inside the sphere of their instance back to its surface, with a frictional impulse
+        """
+        x, v = ti.static(self.state.x, self.state.v)
+        for b, i, j in x:
+            params = self.params[b]
+            dist, normal = sphere_distance(x[b, i, j], tm.vec3(0.0), params.sphere_radius)
+            if dist <= 0:
+                x[b, i, j], v[b, i, j] = respond(x[b, i, j], v[b, i, j], dist, normal, params.mu_T, params.mu_N)
+
+    def step(self):
+        for i in range(self.config.num_substep):
+            self.compute_force()
+            self.explicit_update()
+            self.handle_collision()
+            self.state.time += self.config.dt
+
+
+def build_ensemble(config: ClothConfig, batch: int, **params) -> EnsembleExplicitIntegrator:
+    """
+    Allocate an ensemble of batch cloths and its integrator, then initialize the cloths
+    :param config: setting of every instance, also the default of the instance parameters
+    :param batch: number of instances
+    :param params: value per instance of some of instance_fields, as sequences of length batch or scalars
+    :return: integrator ready to step
+    """
+    unknown = set(params) - set(instance_fields)
+    if unknown:
+        raise ValueError(f"fields {sorted(unknown)} can not vary in an ensemble, only {instance_fields}")
+    if config.spheres is not None or config.boxes or config.self_collision or config.ccd:
+        raise ValueError("ensembles only collide with the sphere of sphere_radius at the origin, "
+                         "without ccd and self collision")
+
+    values = {}
+    for name in instance_fields:
+        value = np.broadcast_to(np.asarray(params.get(name, getattr(config, name)), dtype=np.float32), (batch,))
+        values[name] = value
+    state = EnsembleState(batch, config.n, config.grid_length)
+    integrator = EnsembleExplicitIntegrator(state, config, values)
+    state.init_cloth()
+    return integrator
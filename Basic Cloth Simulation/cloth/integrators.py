@@ -0,0 +1,235 @@
+import taichi as ti
+
+from .chebyshev import ChebyshevAccelerator
+from .collision import ColliderSet
+from .config import ClothConfig
+from .self_collision import SelfCollision
+from .state import ClothState
+
+
+@ti.data_oriented
+class Integrator:
+    """
+    Base of every cloth integrator, step() advances the state by one frame
+    """
+
+    def __init__(self, state: ClothState, collider: ColliderSet, config: ClothConfig):
+        self.state = state
+        self.collider = collider
+        self.config = config
+        self.self_collision = SelfCollision(state, config) if config.self_collision else None
+
+    def resolve_self_collision(self):
+        if self.self_collision is not None:
+            self.self_collision.resolve(self.state)
+
+    def step(self):
+        raise NotImplementedError
+
+
+@ti.data_oriented
+class ExplicitIntegrator(Integrator):
+    """
+    Explicit Euler step with Hook's law springs and impulse collision
+    """
+
+    def __init__(self, state: ClothState, collider: ColliderSet, config: ClothConfig):
+        super().__init__(state, collider, config)
+        n = config.n
+        self.force = ti.Vector.field(3, dtype=float, shape=(n, n))
+        self.x_prev = ti.Vector.field(3, dtype=float, shape=(n, n))
+
+    @ti.kernel
+    def compute_force(self):
+        x, force = ti.static(self.state.x, self.force)
+        for i, j in force:
+            force[i, j] = self.config.mass * self.config.gravity
+
+        for e in self.state.edges:
+            edge = self.state.edges[e]
+            x_diff = x[edge.i] - x[edge.j]
+            # spring force
+            spring = -self.config.spring_k * (x_diff.norm() - edge.rest_length) * x_diff.normalized()
+            force[edge.i] += spring
+            force[edge.j] -= spring
+
+    @ti.kernel
+    def explicit_update(self):
+        x, v = ti.static(self.state.x, self.state.v)
+        dt = ti.static(self.config.dt)
+        for i, j in v:
+            v[i, j] *= self.config.damping
+            v[i, j] += self.force[i, j] * dt / self.config.mass
+            self.x_prev[i, j] = x[i, j]
+            x[i, j] += v[i, j] * dt
+
+    def step(self):
+        for i in range(self.config.num_substep):
+            self.compute_force()
+            self.explicit_update()
+            if self.config.ccd:
+                self.collider.sweep(self.state, self.x_prev)
+            else:
+                self.collider.handle_collision(self.state)
+            self.resolve_self_collision()
+            self.state.time += self.config.dt
+
+
+@ti.data_oriented
+class ImplicitJacobiIntegrator(Integrator):
+    """
+    Implicit Euler step solved by diagonal-scaled gradient descent, based on GAMES 103 HW2
+    """
+
+    def __init__(self, state: ClothState, collider: ColliderSet, config: ClothConfig):
+        super().__init__(state, collider, config)
+        n = config.n
+        self.x_hat = ti.Vector.field(3, dtype=float, shape=(n, n))
+        self.x_prev = ti.Vector.field(3, dtype=float, shape=(n, n))
+        self.gradient = ti.Vector.field(3, dtype=float, shape=(n, n))
+        self.accelerator = ChebyshevAccelerator(state.x, config) if config.chebyshev else None
+
+    @ti.kernel
+    def implicit_update(self):
+        x, v = ti.static(self.state.x, self.state.v)
+        for i, j in v:
+            v[i, j] *= self.config.damping
+            self.x_prev[i, j] = x[i, j]
+            self.x_hat[i, j] = x[i, j] + self.config.dt * v[i, j]
+            x[i, j] = self.x_hat[i, j]
+
+    @ti.kernel
+    def implicit_substep(self):
+        x, x_hat, gradient = ti.static(self.state.x, self.x_hat, self.gradient)
+        t_inverse, mass, spring_k = ti.static(self.config.t_inverse, self.config.mass, self.config.spring_k)
+        for i, j in x:
+            gradient[i, j] = t_inverse * mass * (x[i, j] - x_hat[i, j]) - mass * self.config.gravity
+
+        for e in self.state.edges:
+            edge = self.state.edges[e]
+            x_diff = x[edge.i] - x[edge.j]
+            spring = spring_k * (1 - edge.rest_length / x_diff.norm()) * x_diff
+            gradient[edge.i] += spring
+            gradient[edge.j] -= spring
+
+        # a vertex has up to 8 springs, a smaller diagonal makes the jacobi iteration overshoot
+        coef = t_inverse * mass + 8 * spring_k
+        for i, j in x:
+            x[i, j] -= (1 / coef) * gradient[i, j]
+
+    @ti.kernel
+    def update_velocity(self):
+        x, v = ti.static(self.state.x, self.state.v)
+        for i, j in v:
+            v[i, j] = (x[i, j] - self.x_prev[i, j]) / self.config.dt
+
+    def step(self):
+        self.implicit_update()
+        # keep x_hat and the iterate outside the colliders, otherwise one large dt drags the cloth through them
+        self.collider.push_out(self.x_hat, self.x_prev)
+        self.collider.push_out(self.state.x, self.x_prev)
+        if self.accelerator is not None:
+            self.accelerator.run(self.implicit_substep, self.config.num_substep)
+        else:
+            for i in range(self.config.num_substep):
+                self.implicit_substep()
+        self.collider.push_out(self.state.x, self.x_prev)
+        self.update_velocity()
+        if self.config.ccd:
+            self.collider.sweep(self.state, self.x_prev)
+        else:
+            self.collider.project(self.state, self.config.dt)
+        self.resolve_self_collision()
+        self.state.time += self.config.dt
+
+
+@ti.data_oriented
+class PBDIntegrator(Integrator):
+    """
+    Position based dynamics step, config.pbd_mode chooses between Jacobi averaged spring
+    projection and graph-colored Gauss-Seidel projection, config.num_substep is the iteration count
+    """
+
+    def __init__(self, state: ClothState, collider: ColliderSet, config: ClothConfig):
+        super().__init__(state, collider, config)
+        if config.pbd_mode not in ("jacobi", "gauss_seidel"):
+            raise ValueError(f"unknown pbd_mode {config.pbd_mode}")
+        if config.chebyshev and config.pbd_mode != "jacobi":
+            raise ValueError("chebyshev acceleration requires pbd_mode jacobi")
+        n = config.n
+        self.x_prev = ti.Vector.field(3, dtype=float, shape=(n, n))
+        self.sum_x = ti.Vector.field(3, dtype=float, shape=(n, n))
+        self.sum_n = ti.field(dtype=int, shape=(n, n))
+        self.accelerator = ChebyshevAccelerator(state.x, config) if config.chebyshev else None
+
+    @ti.kernel
+    def update(self):
+        x, v = ti.static(self.state.x, self.state.v)
+        dt = ti.static(self.config.dt)
+        for i, j in v:
+            v[i, j] *= self.config.damping
+            v[i, j] += self.config.gravity * dt
+            self.x_prev[i, j] = x[i, j]
+            x[i, j] += v[i, j] * dt
+
+    @ti.kernel
+    def substep(self):
+        x, v, sum_x, sum_n = ti.static(self.state.x, self.state.v, self.sum_x, self.sum_n)
+        dt = ti.static(self.config.dt)
+        for i, j in x:
+            sum_x[i, j] = [0, 0, 0]
+            sum_n[i, j] = 0
+
+        for e in self.state.edges:
+            edge = self.state.edges[e]
+            center = 0.5 * (x[edge.i] + x[edge.j])
+            half_edge = 0.5 * edge.rest_length * (x[edge.i] - x[edge.j]).normalized()
+            sum_x[edge.i] += center + half_edge
+            sum_x[edge.j] += center - half_edge
+            sum_n[edge.i] += 1
+            sum_n[edge.j] += 1
+
+        for i, j in x:
+            v[i, j] += 1 / dt * ((0.2 * x[i, j] + sum_x[i, j]) / (0.2 + sum_n[i, j]) - x[i, j])
+            x[i, j] = (0.2 * x[i, j] + sum_x[i, j]) / (0.2 + sum_n[i, j])
+
+    @ti.kernel
+    def project_batch(self, begin: int, end: int):
+        """
+        Gauss-Seidel projection of one color batch, no two springs of the batch share a vertex
+        """
+        x = ti.static(self.state.x)
+        for e in range(begin, end):
+            edge = self.state.edges[e]
+            x_diff = x[edge.i] - x[edge.j]
+            correction = 0.5 * self.config.pbd_stiffness * (x_diff.norm() - edge.rest_length) * x_diff.normalized()
+            x[edge.i] -= correction
+            x[edge.j] += correction
+
+    @ti.kernel
+    def update_velocity(self):
+        x, v = ti.static(self.state.x, self.state.v)
+        for i, j in v:
+            v[i, j] = (x[i, j] - self.x_prev[i, j]) / self.config.dt
+
+    def step(self):
+        for i in range(2):
+            self.update()
+            if self.accelerator is not None:
+                # acceleration moves x after substep, rebuild velocity from the final position
+                self.accelerator.run(self.substep, self.config.num_substep)
+                self.update_velocity()
+            elif self.config.pbd_mode == "jacobi":
+                for j in range(self.config.num_substep):
+                    self.substep()
+            else:
+                for j in range(self.config.num_substep):
+                    for begin, end in self.state.edge_batches:
+                        self.project_batch(begin, end)
+                self.update_velocity()
+            if self.config.ccd:
+                self.collider.sweep(self.state, self.x_prev)
+            else:
+                self.collider.handle_collision(self.state)
+            self.resolve_self_collision()
+            self.state.time += self.config.dt
@@ -0,0 +1,174 @@
+import taichi as ti
+import taichi.math as tm
+
+from .collision import ColliderSet
+from .config import ClothConfig
+from .integrators import Integrator
+from .state import ClothState
+
+# squared residual norm under which the newton system is taken as solved, guards the divisions of cg
+residual_epsilon = 1e-20
+
+
+@ti.data_oriented
+class ImplicitNewtonIntegrator(Integrator):
+    """
+    Implicit Euler step solved by Newton's method, every Newton step solves H dx = -g with a
+    matrix-free Jacobi preconditioned conjugate gradient that exits once the residual is small enough
+    """
+
+    def __init__(self, state: ClothState, collider: ColliderSet, config: ClothConfig):
+        super().__init__(state, collider, config)
+        n = config.n
+        self.x_hat = ti.Vector.field(3, dtype=float, shape=(n, n))
+        self.x_prev = ti.Vector.field(3, dtype=float, shape=(n, n))
+
+        # spring hessian is stored per edge, the system matrix is never assembled
+        self.hessian = ti.Matrix.field(3, 3, dtype=float, shape=state.num_edges)
+        self.diagonal = ti.Vector.field(3, dtype=float, shape=(n, n))
+
+        # conjugate gradient buffers
+        self.dx = ti.Vector.field(3, dtype=float, shape=(n, n))
+        self.r = ti.Vector.field(3, dtype=float, shape=(n, n))
+        self.z = ti.Vector.field(3, dtype=float, shape=(n, n))
+        self.p = ti.Vector.field(3, dtype=float, shape=(n, n))
+        self.Ap = ti.Vector.field(3, dtype=float, shape=(n, n))
+
+        self.cg_iterations = 0  # total cg iterations of the last step, for reporting
+
+    @ti.kernel
+    def predict(self):
+        x, v = ti.static(self.state.x, self.state.v)
+        for i, j in v:
+            v[i, j] *= self.config.damping
+            self.x_prev[i, j] = x[i, j]
+            self.x_hat[i, j] = x[i, j] + self.config.dt * v[i, j]
+            x[i, j] = self.x_hat[i, j]
+
+    @ti.kernel
+    def assemble(self):
+        """
+        Compute residual r = -gradient, the per-edge spring hessian and the jacobi preconditioner
+        """
+        x, r, diagonal = ti.static(self.state.x, self.r, self.diagonal)
+        inertia, spring_k = ti.static(self.config.t_inverse * self.config.mass, self.config.spring_k)
+        for i, j in x:
+            r[i, j] = -inertia * (x[i, j] - self.x_hat[i, j]) + self.config.mass * self.config.gravity
+            diagonal[i, j] = tm.vec3(inertia)
+
+        for e in self.state.edges:
+            edge = self.state.edges[e]
+            x_diff = x[edge.i] - x[edge.j]
+            length = x_diff.norm()
+            spring = spring_k * (1 - edge.rest_length / length) * x_diff
+            r[edge.i] -= spring
+            r[edge.j] += spring
+
+            # clamp the transverse term so the hessian stays positive semi-definite under compression
+            direction = x_diff / length
+            outer = direction.outer_product(direction)
+            hessian = spring_k * (outer + max(1 - edge.rest_length / length, 0.0) * (tm.eye(3) - outer))
+            self.hessian[e] = hessian
+            hessian_diagonal = tm.vec3(hessian[0, 0], hessian[1, 1], hessian[2, 2])
+            diagonal[edge.i] += hessian_diagonal
+            diagonal[edge.j] += hessian_diagonal
+
+    @ti.kernel
+    def multiply(self, p: ti.template(), Ap: ti.template()):
+        inertia = ti.static(self.config.t_inverse * self.config.mass)
+        for i, j in p:
+            Ap[i, j] = inertia * p[i, j]
+
+        for e in self.state.edges:
+            edge = self.state.edges[e]
+            product = self.hessian[e] @ (p[edge.i] - p[edge.j])
+            Ap[edge.i] += product
+            Ap[edge.j] -= product
+
+    @ti.kernel
+    def dot(self, a: ti.template(), b: ti.template()) -> float:
+        result = 0.0
+        for i, j in a:
+            result += a[i, j].dot(b[i, j])
+        return result
+
+    @ti.kernel
+    def cg_init(self):
+        for i, j in self.r:
+            self.dx[i, j] = tm.vec3(0.0)
+            self.z[i, j] = self.r[i, j] / self.diagonal[i, j]
+            self.p[i, j] = self.z[i, j]
+
+    @ti.kernel
+    def cg_update(self, alpha: float):
+        for i, j in self.r:
+            self.dx[i, j] += alpha * self.p[i, j]
+            self.r[i, j] -= alpha * self.Ap[i, j]
+            self.z[i, j] = self.r[i, j] / self.diagonal[i, j]
+
+    @ti.kernel
+    def cg_direction(self, beta: float):
+        for i, j in self.p:
+            self.p[i, j] = self.z[i, j] + beta * self.p[i, j]
+
+    @ti.kernel
+    def apply_step(self):
+        for i, j in self.dx:
+            self.state.x[i, j] += self.dx[i, j]
+
+    @ti.kernel
+    def update_velocity(self):
+        x, v = ti.static(self.state.x, self.state.v)
+        for i, j in v:
+            v[i, j] = (x[i, j] - self.x_prev[i, j]) / self.config.dt
+
+    def solve(self, r0: float):
+        """
+        Jacobi preconditioned conjugate gradient on the current newton system
+        :param r0: squared norm of the initial residual, i.e. of the gradient
+        """
+        self.cg_init()
+        rz = self.dot(self.r, self.z)
+        threshold = self.config.cg_tolerance * self.config.cg_tolerance * r0
+        for k in range(self.config.cg_iterations):
+            self.multiply(self.p, self.Ap)
+            pAp = self.dot(self.p, self.Ap)
+            # the residual vanished, e.g. a cloth at rest, dx is already the solution
+            if pAp <= residual_epsilon:
+                break
+            alpha = rz / pAp
+            self.cg_update(alpha)
+            self.cg_iterations += 1
+            if self.dot(self.r, self.r) <= threshold:
+                break
+            rz_new = self.dot(self.r, self.z)
+            self.cg_direction(rz_new / rz)
+            rz = rz_new
+
+    def step(self):
+        self.cg_iterations = 0
+        self.predict()
+        # the inertia term pulls every vertex toward x_hat, keep it outside the colliders as well as every
+        # newton iterate, otherwise one large dt drags the cloth through them
+        self.collider.push_out(self.x_hat, self.x_prev)
+        self.collider.push_out(self.state.x, self.x_prev)
+        threshold = 0.0
+        for k in range(self.config.newton_iterations):
+            self.assemble()
+            r0 = self.dot(self.r, self.r)
+            if k == 0:
+                threshold = self.config.newton_tolerance * self.config.newton_tolerance * r0
+                if r0 <= residual_epsilon:
+                    break
+            elif r0 <= threshold:
+                break
+            self.solve(r0)
+            self.apply_step()
+            self.collider.push_out(self.state.x, self.x_prev)
+        self.update_velocity()
+        if self.config.ccd:
+            self.collider.sweep(self.state, self.x_prev)
+        else:
+            self.collider.project(self.state, self.config.dt)
+        self.resolve_self_collision()
+        self.state.time += self.config.dt
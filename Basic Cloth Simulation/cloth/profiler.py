@@ -0,0 +1,176 @@
+import contextlib
+import json
+import time
+from collections import defaultdict
+
+import numpy as np
+import taichi as ti
+
+
+class Profiler:
+    """
+    Opt-in timing of the cloth kernels. instrument() wraps every kernel of an integrator and of its state,
+    colliders and helpers with a timer that synchronizes before and after the launch, so each duration is
+    the device time of that kernel alone. Durations feed per-kernel histograms, counters collect the
+    contacts per collision pass and the iterations of the iterative solvers, and every call is kept as an
+    event of a Chrome trace (chrome://tracing or https://ui.perfetto.dev)
+    """
+
+    def __init__(self, report_every: int = 0, trace: str = None, sync: bool = True, max_events: int = 1_000_000):
+        """
+        :param report_every: print the report of the last report_every frames, 0 only reports on close()
+        :param trace: path of the Chrome trace .json written by close()
+        :param sync: synchronize around every timed call, without it launches are timed instead of kernels
+        :param max_events: events kept for the trace, the statistics keep counting past it
+        """
+        self.report_every = report_every
+        self.trace = trace
+        self.sync = sync
+        self.max_events = max_events
+        self.frame = 0
+        self.origin = time.perf_counter()
+        self.events = []
+        self.durations = defaultdict(list)
+        self.counters = defaultdict(list)
+
+    @contextlib.contextmanager
+    def section(self, name: str, category: str = "host"):
+        """
+        Time the enclosed block as one event named name
+        """
+        if self.sync:
+            ti.sync()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.sync:
+                ti.sync()
+            end = time.perf_counter()
+            self.durations[name].append(end - start)
+            if len(self.events) < self.max_events:
+                self.events.append((name, category, start - self.origin, end - start))
+
+    def count(self, name: str, value: float):
+        """
+        Record one sample of counter name
+        """
+        self.counters[name].append(value)
+        if len(self.events) < self.max_events:
+            self.events.append((name, "counter", time.perf_counter() - self.origin, value))
+
+    def wrap(self, obj, name: str, category: str = "kernel", after=None):
+        """
+        Replace the method name of obj by a timed call of it
+        :param after: optional callable run after every call, e.g. to read a counter
+        """
+        method = getattr(obj, name)
+
+        def timed(*args, **kwargs):
+            with self.section(f"{type(obj).__name__}.{name}", category):
+                result = method(*args, **kwargs)
+            if after is not None:
+                after()
+            return result
+
+        setattr(obj, name, timed)
+
+    def wrap_kernels(self, obj):
+        """
+        Time every kernel of obj, i.e. every method decorated with ti.kernel in its class hierarchy
+        """
+        names = {name for cls in type(obj).__mro__ for name, value in vars(cls).items()
+                 if hasattr(value, "_is_wrapped_kernel")}
+        for name in sorted(names):
+            self.wrap(obj, name)
+
+    def instrument(self, integrator):
+        """
+        Time step() and every kernel of the integrator, count the contacts of the colliders and the solver
+        iterations. Call it before the first step, the contact counting is compiled into the collision kernels
+        """
+        collider = integrator.collider
+        collider.count_contacts = True
+
+        def read_contacts():
+            self.count("contacts", collider.num_contacts[None])
+            collider.num_contacts[None] = 0
+
+        for name in ("handle_collision", "sweep", "project", "push_out"):
+            self.wrap(collider, name, after=read_contacts)
+        for obj in (integrator, integrator.state, integrator.self_collision, getattr(integrator, "accelerator", None)):
+            if obj is not None:
+                self.wrap_kernels(obj)
+
+        def read_iterations():
+            if hasattr(integrator, "cg_iterations"):
+                self.count("cg_iterations", integrator.cg_iterations)
+            accelerator = getattr(integrator, "accelerator", None)
+            if accelerator is not None and accelerator.residuals:
+                self.count("chebyshev_residual", accelerator.residuals[-1])
+
+        self.wrap(integrator, "step", category="frame", after=read_iterations)
+
+    def get_histogram(self, name: str, bins: int = 10) -> (np.ndarray, np.ndarray):
+        """
+        :return: call count per bin and the bin edges in milliseconds of the durations of name
+        """
+        return np.histogram(1000 * np.array(self.durations[name]), bins=bins)
+
+    def report(self) -> str:
+        """
+        Table of the time spent in every timed call and of the counters
+        """
+        lines = [f"{'name':<40} {'calls':>7} {'total ms':>10} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}"]
+        for name, durations in sorted(self.durations.items(), key=lambda item: -sum(item[1])):
+            ms = 1000 * np.array(durations)
+            lines.append(f"{name:<40} {len(ms):>7} {ms.sum():>10.2f} {ms.mean():>9.3f} {np.percentile(ms, 50):>8.3f} "
+                         f"{np.percentile(ms, 95):>8.3f} {ms.max():>8.3f}")
+        for name, values in sorted(self.counters.items()):
+            values = np.array(values, dtype=np.float64)
+            lines.append(f"{name:<40} {len(values):>7} samples, mean {values.mean():.4g}, max {values.max():.4g}")
+        return "\n".join(lines)
+
+    def reset(self):
+        """
+        Drop the statistics collected so far, the trace events are kept
+        """
+        self.durations.clear()
+        self.counters.clear()
+
+    def end_frame(self):
+        """
+        Call once per displayed or stored frame, prints the periodic report
+        """
+        self.frame += 1
+        if self.report_every > 0 and self.frame % self.report_every == 0:
+            print(f"profile of frames {self.frame - self.report_every} to {self.frame - 1}:")
+            print(self.report())
+            self.reset()
+
+    def close(self):
+        """
+        Print the report of the frames since the last one, the per-kernel summary of ti.profiler when
+        taichi runs with kernel_profiler=True, and write the trace
+        """
+        if self.durations:
+            print(self.report())
+        if ti.lang.impl.current_cfg().kernel_profiler:
+            ti.profiler.print_kernel_profiler_info()
+        if self.trace is not None:
+            self.write_trace(self.trace)
+            print(f"trace written to {self.trace}")
+
+    def write_trace(self, path: str):
+        """
+        Write the events in the Chrome trace event format
+        """
+        trace = []
+        for name, category, start, value in self.events:
+            if category == "counter":
+                trace.append({"name": name, "ph": "C", "ts": 1e6 * start, "pid": 0, "args": {name: value}})
+            else:
+                trace.append({"name": name, "cat": category, "ph": "X", "ts": 1e6 * start, "dur": 1e6 * value,
+                              "pid": 0, "tid": 0})
+        with open(path, "w") as file:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, file)
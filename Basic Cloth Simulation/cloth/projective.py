@@ -0,0 +1,117 @@
+import taichi as ti
+import taichi.math as tm
+
+from .collision import ColliderSet
+from .config import ClothConfig
+from .integrators import Integrator
+from .state import ClothState
+
+
+@ti.data_oriented
+class ProjectiveDynamicsIntegrator(Integrator):
+    """
+    Projective Dynamics step (Bouaziz 2014). The global matrix M / dt^2 + spring_k * L only depends on
+    the fixed grid topology, so it is Cholesky factored once at init and every local/global iteration
+    is a parallel per-spring projection followed by a prefactored back-substitution.
+    Relies on taichi sparse solver, which is only available on cpu and cuda backend.
+    """
+
+    def __init__(self, state: ClothState, collider: ColliderSet, config: ClothConfig):
+        super().__init__(state, collider, config)
+        n = config.n
+        self.x_hat = ti.Vector.field(3, dtype=float, shape=(n, n))
+        self.x_prev = ti.Vector.field(3, dtype=float, shape=(n, n))
+
+        # x, y and z are interleaved so the three coordinates are solved at once.
+        # the system is solved in double precision: its smallest eigenvalue is mass / dt^2,
+        # so a single precision factor loses the rigid translation of light cloth
+        num_dof = 3 * n * n
+        self.rhs = ti.ndarray(dtype=ti.f64, shape=num_dof)
+
+        builder = ti.linalg.SparseMatrixBuilder(num_dof, num_dof, max_num_triplets=num_dof + 12 * state.num_edges,
+                                                dtype=ti.f64)
+        self.fill_matrix(builder)
+        matrix = builder.build()
+        self.solver = ti.linalg.SparseSolver(dtype=ti.f64, solver_type="LLT")
+        self.solver.analyze_pattern(matrix)
+        self.solver.factorize(matrix)
+
+    @ti.func
+    def dof(self, index: tm.ivec2) -> int:
+        return 3 * (index[0] * self.config.n + index[1])
+
+    @ti.kernel
+    def fill_matrix(self, builder: ti.types.sparse_matrix_builder()):
+        inertia, spring_k = ti.static(self.config.t_inverse * self.config.mass, self.config.spring_k)
+        for i, j in self.state.x:
+            row = self.dof(tm.ivec2(i, j))
+            for k in ti.static(range(3)):
+                builder[row + k, row + k] += inertia
+
+        for e in self.state.edges:
+            edge = self.state.edges[e]
+            row, col = self.dof(edge.i), self.dof(edge.j)
+            for k in ti.static(range(3)):
+                builder[row + k, row + k] += spring_k
+                builder[col + k, col + k] += spring_k
+                builder[row + k, col + k] -= spring_k
+                builder[col + k, row + k] -= spring_k
+
+    @ti.kernel
+    def predict(self):
+        x, v = ti.static(self.state.x, self.state.v)
+        dt = ti.static(self.config.dt)
+        for i, j in v:
+            v[i, j] *= self.config.damping
+            self.x_prev[i, j] = x[i, j]
+            self.x_hat[i, j] = x[i, j] + dt * v[i, j] + dt * dt * self.config.gravity
+            x[i, j] = self.x_hat[i, j]
+
+    @ti.kernel
+    def local_step(self, rhs: ti.types.ndarray()):
+        """
+        Project every spring to its rest length and accumulate the right hand side of the global step
+        """
+        x = ti.static(self.state.x)
+        inertia, spring_k = ti.static(self.config.t_inverse * self.config.mass, self.config.spring_k)
+        for i, j in x:
+            row = self.dof(tm.ivec2(i, j))
+            for k in ti.static(range(3)):
+                rhs[row + k] = inertia * self.x_hat[i, j][k]
+
+        for e in self.state.edges:
+            edge = self.state.edges[e]
+            projection = edge.rest_length * (x[edge.i] - x[edge.j]).normalized()
+            row, col = self.dof(edge.i), self.dof(edge.j)
+            for k in ti.static(range(3)):
+                rhs[row + k] += spring_k * projection[k]
+                rhs[col + k] -= spring_k * projection[k]
+
+    @ti.kernel
+    def global_step(self, solution: ti.types.ndarray()):
+        for i, j in self.state.x:
+            row = self.dof(tm.ivec2(i, j))
+            self.state.x[i, j] = tm.vec3(solution[row], solution[row + 1], solution[row + 2])
+
+    @ti.kernel
+    def update_velocity(self):
+        x, v = ti.static(self.state.x, self.state.v)
+        for i, j in v:
+            v[i, j] = (x[i, j] - self.x_prev[i, j]) / self.config.dt
+
+    def step(self):
+        self.predict()
+        # the global step pulls every vertex toward x_hat, keep it outside the colliders as well as the iterate,
+        # otherwise one large dt drags the cloth through them
+        self.collider.push_out(self.x_hat, self.x_prev)
+        for k in range(self.config.num_substep):
+            self.local_step(self.rhs)
+            self.global_step(self.solver.solve(self.rhs))
+            self.collider.push_out(self.state.x, self.x_prev)
+        self.update_velocity()
+        if self.config.ccd:
+            self.collider.sweep(self.state, self.x_prev)
+        else:
+            self.collider.handle_collision(self.state)
+        self.resolve_self_collision()
+        self.state.time += self.config.dt
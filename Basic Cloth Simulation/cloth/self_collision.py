@@ -0,0 +1,164 @@
+import taichi as ti
+import taichi.math as tm
+
+from .config import ClothConfig
+from .spatial_hash import SpatialHash
+from .state import ClothState
+
+
+@ti.func
+def closest_point_triangle(p: tm.vec3, a: tm.vec3, b: tm.vec3, c: tm.vec3) -> tm.vec3:
+    """
+    Barycentric coordinate of the point of triangle abc closest to p, Ericson "Real-Time Collision Detection" 5.1.5
+    """
+    ab, ac, ap = b - a, c - a, p - a
+    d1, d2 = ab.dot(ap), ac.dot(ap)
+    bp = p - b
+    d3, d4 = ab.dot(bp), ac.dot(bp)
+    cp = p - c
+    d5, d6 = ab.dot(cp), ac.dot(cp)
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+
+    weight = tm.vec3(0.0)
+    if d1 <= 0 and d2 <= 0:
+        weight = tm.vec3(1, 0, 0)
+    elif d3 >= 0 and d4 <= d3:
+        weight = tm.vec3(0, 1, 0)
+    elif vc <= 0 and d1 >= 0 and d3 <= 0:
+        t = d1 / (d1 - d3)
+        weight = tm.vec3(1 - t, t, 0)
+    elif d6 >= 0 and d5 <= d6:
+        weight = tm.vec3(0, 0, 1)
+    elif vb <= 0 and d2 >= 0 and d6 <= 0:
+        t = d2 / (d2 - d6)
+        weight = tm.vec3(1 - t, 0, t)
+    elif va <= 0 and d4 - d3 >= 0 and d5 - d6 >= 0:
+        t = (d4 - d3) / ((d4 - d3) + (d5 - d6))
+        weight = tm.vec3(0, 1 - t, t)
+    else:
+        denominator = 1 / (va + vb + vc)
+        v, w = vb * denominator, vc * denominator
+        weight = tm.vec3(1 - v - w, v, w)
+    return weight
+
+
+@ti.data_oriented
+class SelfCollision:
+    """
+    Cloth-cloth contact. Vertices and triangle centroids are hashed every call, then every vertex only tests
+    the vertices and triangles of its 27 neighbor cells, keeping the cost near O(N).
+    Pairs closer than thickness are pushed apart, corrections are Jacobi averaged per vertex
+    """
+
+    def __init__(self, state: ClothState, config: ClothConfig):
+        n = state.n
+        self.n = n
+        self.thickness = config.collision_thickness
+        if self.thickness <= 0:
+            self.thickness = 0.5 * state.grid_interval
+        self.num_vertices = n * n
+        self.num_triangles = 2 * (n - 1) * (n - 1)
+
+        # vertex pairs only need thickness sized cells, a triangle is hashed by its centroid which can be
+        # one edge away from its surface, allow the edge to stretch twice its rest length
+        self.vertex_hash = SpatialHash(self.num_vertices, self.thickness)
+        self.triangle_hash = SpatialHash(self.num_triangles, self.thickness + 2 * 2 ** 0.5 * state.grid_interval)
+
+        self.points = ti.Vector.field(3, dtype=float, shape=self.num_vertices)
+        self.centroids = ti.Vector.field(3, dtype=float, shape=self.num_triangles)
+        self.delta = ti.Vector.field(3, dtype=float, shape=self.num_vertices)
+        self.delta_count = ti.field(dtype=int, shape=self.num_vertices)
+        self.num_contacts = ti.field(dtype=int, shape=())
+
+    @ti.func
+    def adjacent(self, a: int, b: int) -> bool:
+        """
+        Vertices within one ring of each other are held apart by the springs, never treat them as contact
+        """
+        return abs(a // self.n - b // self.n) <= 1 and abs(a % self.n - b % self.n) <= 1
+
+    @ti.kernel
+    def gather(self, state: ti.template()):
+        for i, j in state.x:
+            self.points[i * self.n + j] = state.x[i, j]
+            self.delta[i * self.n + j] = tm.vec3(0.0)
+            self.delta_count[i * self.n + j] = 0
+        for t in self.centroids:
+            a, b, c = state.triangles[3 * t], state.triangles[3 * t + 1], state.triangles[3 * t + 2]
+            self.centroids[t] = (self.points[a] + self.points[b] + self.points[c]) / 3
+        self.num_contacts[None] = 0
+
+    @ti.func
+    def add_delta(self, k: int, delta: tm.vec3):
+        self.delta[k] += delta
+        self.delta_count[k] += 1
+
+    @ti.kernel
+    def vertex_vertex(self):
+        for k in self.points:
+            p = self.points[k]
+            center = self.vertex_hash.cell(p)
+            for o in range(27):
+                cell = self.vertex_hash.neighbor_cell(center, o)
+                h = self.vertex_hash.hash(cell)
+                for s in range(self.vertex_hash.cell_start[h], self.vertex_hash.cell_start[h + 1]):
+                    m = self.vertex_hash.entries[s]
+                    x_diff = p - self.points[m]
+                    dist = x_diff.norm()
+                    if (self.vertex_hash.cell(self.points[m]) == cell).all() and m != k and not self.adjacent(k, m) \
+                            and 0 < dist < self.thickness:
+                        # each pair is seen from both vertices, move this one only by half the overlap
+                        self.add_delta(k, 0.5 * (self.thickness - dist) * x_diff / dist)
+                        self.num_contacts[None] += 1
+
+    @ti.kernel
+    def vertex_triangle(self, state: ti.template()):
+        for k in self.points:
+            p = self.points[k]
+            center = self.triangle_hash.cell(p)
+            for o in range(27):
+                cell = self.triangle_hash.neighbor_cell(center, o)
+                h = self.triangle_hash.hash(cell)
+                for s in range(self.triangle_hash.cell_start[h], self.triangle_hash.cell_start[h + 1]):
+                    t = self.triangle_hash.entries[s]
+                    a, b, d = state.triangles[3 * t], state.triangles[3 * t + 1], state.triangles[3 * t + 2]
+                    if (self.triangle_hash.cell(self.centroids[t]) == cell).all() and \
+                            not (self.adjacent(k, a) or self.adjacent(k, b) or self.adjacent(k, d)):
+                        weight = closest_point_triangle(p, self.points[a], self.points[b], self.points[d])
+                        q = weight.x * self.points[a] + weight.y * self.points[b] + weight.z * self.points[d]
+                        dist = (p - q).norm()
+                        if 0 < dist < self.thickness:
+                            correction = 0.5 * (self.thickness - dist) * (p - q) / dist
+                            self.add_delta(k, correction)
+                            self.add_delta(a, -weight.x * correction)
+                            self.add_delta(b, -weight.y * correction)
+                            self.add_delta(d, -weight.z * correction)
+                            self.num_contacts[None] += 1
+
+    @ti.kernel
+    def apply(self, state: ti.template()):
+        for i, j in state.x:
+            k = i * self.n + j
+            if self.delta_count[k] > 0:
+                delta = self.delta[k] / self.delta_count[k]
+                state.x[i, j] += delta
+                # drop the velocity into the contact as well, the next step would push the vertex back otherwise
+                normal = delta.normalized()
+                v_normal = state.v[i, j].dot(normal)
+                if v_normal < 0:
+                    state.v[i, j] -= v_normal * normal
+
+    def resolve(self, state: ClothState):
+        """
+        Rebuild both hashes and push apart every vertex-vertex and vertex-triangle pair closer than thickness,
+        the velocity of a moved vertex loses its component against the correction. The number of pairs found
+        is left in num_contacts
+        """
+        self.gather(state)
+        self.vertex_hash.build(self.points)
+        self.triangle_hash.build(self.centroids)
+        self.vertex_vertex()
+        self.vertex_triangle(state)
+        self.apply(state)
@@ -0,0 +1,95 @@
+import taichi as ti
+import taichi.math as tm
+
+# cells scanned per block by the first pass of the prefix sum
+scan_block = 1024
+
+
+@ti.data_oriented
+class SpatialHash:
+    """
+    Uniform grid hashed into a fixed size table. build() counts the points of every cell, compacts them with
+    a prefix sum, then points of the cell with hash h are entries[cell_start[h]:cell_start[h + 1]].
+    The slots of h also hold the points of every other cell hashed to h, compare the cell of an entry
+    with the scanned one to visit every point once
+    """
+
+    def __init__(self, num_points: int, cell_size: float, table_size: int = None):
+        self.num_points = num_points
+        self.cell_size = cell_size
+        if table_size is None:
+            table_size = 1 << (2 * num_points - 1).bit_length()
+        self.table_size = table_size
+        self.num_blocks = (table_size + scan_block - 1) // scan_block
+
+        self.cell_count = ti.field(dtype=int, shape=table_size)
+        self.cell_start = ti.field(dtype=int, shape=table_size + 1)
+        self.block_sum = ti.field(dtype=int, shape=self.num_blocks)
+        self.point_hash = ti.field(dtype=int, shape=num_points)
+        self.entries = ti.field(dtype=int, shape=num_points)
+
+    @ti.func
+    def cell(self, p: tm.vec3) -> tm.ivec3:
+        return ti.floor(p / self.cell_size, int)
+
+    @ti.func
+    def hash(self, c: tm.ivec3) -> int:
+        h = (c.x * 73856093) ^ (c.y * 19349663) ^ (c.z * 83492791)
+        return h % self.table_size
+
+    @ti.func
+    def neighbor_cell(self, c: tm.ivec3, k: int) -> tm.ivec3:
+        """
+        k-th of the 27 cells around cell c, k in [0, 27). Loop over k at runtime, unrolling the 27 cells
+        into the kernels that scan them blows up their compile time
+        """
+        return c + tm.ivec3(k // 9 - 1, k // 3 % 3 - 1, k % 3 - 1)
+
+    @ti.kernel
+    def count(self, points: ti.template()):
+        for h in self.cell_count:
+            self.cell_count[h] = 0
+        for k in points:
+            h = self.hash(self.cell(points[k]))
+            self.point_hash[k] = h
+            ti.atomic_add(self.cell_count[h], 1)
+
+    @ti.kernel
+    def prefix_sum(self):
+        """
+        Exclusive prefix sum of cell_count into cell_start, scanned per block then offset by the block sums.
+        cell_count is reset afterwards to be reused as insertion cursor
+        """
+        for b in self.block_sum:
+            total = 0
+            for h in range(b * scan_block, min((b + 1) * scan_block, self.table_size)):
+                self.cell_start[h] = total
+                total += self.cell_count[h]
+            self.block_sum[b] = total
+
+        ti.loop_config(serialize=True)
+        for b in range(1, self.num_blocks):
+            self.block_sum[b] += self.block_sum[b - 1]
+
+        for h in self.cell_count:
+            b = h // scan_block
+            if b > 0:
+                self.cell_start[h] += self.block_sum[b - 1]
+            self.cell_count[h] = 0
+        self.cell_start[self.table_size] = self.block_sum[self.num_blocks - 1]
+
+    @ti.kernel
+    def fill(self):
+        for k in self.point_hash:
+            h = self.point_hash[k]
+            slot = ti.atomic_add(self.cell_count[h], 1)
+            self.entries[self.cell_start[h] + slot] = k
+
+    def build(self, points: ti.MatrixField):
+        """
+        Rebuild the table from scratch
+        :param points: 1D vector field of num_points positions
+        """
+        self.count(points)
+        self.prefix_sum()
+        self.fill()
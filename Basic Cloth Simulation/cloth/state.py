@@ -0,0 +1,57 @@
+import taichi as ti
+
+from .edges import Edge, build_grid_edges
+
+
+@ti.data_oriented
+class ClothState:
+    """
+    Struct-of-arrays container of a n x n cloth grid and its render buffers
+    """
+
+    def __init__(self, n: int, grid_length: float, height: float = 0.8):
+        self.n = n
+        self.grid_length = grid_length
+        self.grid_interval = grid_length / n
+        self.height = height
+        self.time = 0.0
+
+        self.x = ti.Vector.field(3, dtype=float, shape=(n, n))
+        self.v = ti.Vector.field(3, dtype=float, shape=(n, n))
+
+        self.vertices = ti.Vector.field(3, dtype=float, shape=n * n)
+        self.colors = ti.Vector.field(3, dtype=float, shape=n * n)
+        self.triangles = ti.field(dtype=int, shape=(n - 1) * (n - 1) * 6)
+
+        # springs are static, build them once and let the integrators loop over them
+        edges, self.edge_batches = build_grid_edges(n, self.grid_interval)
+        self.num_edges = len(edges["rest_length"])
+        self.edges = Edge.field(shape=self.num_edges)
+        self.edges.from_numpy(edges)
+
+    @ti.kernel
+    def init_cloth(self):
+        n = ti.static(self.n)
+        for i, j in self.x:
+            self.x[i, j] = [i * self.grid_interval - 0.5 * self.grid_length,
+                            self.height,
+                            j * self.grid_interval - 0.5 * self.grid_length]
+            self.v[i, j] = [0, 0, 0]
+
+        for i, j in ti.ndrange(n - 1, n - 1):
+            index = 6 * (i * (n - 1) + j)
+            self.triangles[index] = i * n + j
+            self.triangles[index + 1] = (i + 1) * n + j
+            self.triangles[index + 2] = i * n + (j + 1)
+
+            self.triangles[index + 3] = (i + 1) * n + (j + 1)
+            self.triangles[index + 4] = i * n + (j + 1)
+            self.triangles[index + 5] = (i + 1) * n + j
+
+        for i in ti.ndrange(n * n):
+            self.colors[i] = (0, 0.5, 0.5)
+
+    @ti.kernel
+    def assign_vertices(self):
+        for i, j in self.x:
+            self.vertices[i * self.n + j] = self.x[i, j]
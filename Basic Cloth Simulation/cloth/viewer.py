@@ -0,0 +1,77 @@
+import contextlib
+
+import numpy as np
+import taichi as ti
+
+from .collision import ColliderSet
+from .integrators import Integrator
+from .profiler import Profiler
+
+# corner pairs of the 12 edges of a box, corner k is at center + half_size * (+-1, +-1, +-1) following the bits of k
+box_edges = [(0, 1), (2, 3), (4, 5), (6, 7), (0, 2), (1, 3), (4, 6), (5, 7), (0, 4), (1, 5), (2, 6), (3, 7)]
+
+
+def box_wireframe(collider: ColliderSet) -> (ti.MatrixField, ti.Field):
+    """
+    Line vertices and indices drawing the edges of every box collider
+    """
+    corners = []
+    for b in range(collider.num_boxes):
+        center, half_size = collider.box_center[b].to_numpy(), collider.box_half_size[b].to_numpy()
+        for k in range(8):
+            sign = np.array([1 if k & 4 else -1, 1 if k & 2 else -1, 1 if k & 1 else -1])
+            corners.append(center + sign * half_size)
+    indices = [8 * b + corner for b in range(collider.num_boxes) for edge in box_edges for corner in edge]
+
+    vertices = ti.Vector.field(3, dtype=float, shape=len(corners))
+    vertices.from_numpy(np.array(corners, dtype=np.float32))
+    lines = ti.field(dtype=int, shape=len(indices))
+    lines.from_numpy(np.array(indices, dtype=np.int32))
+    return vertices, lines
+
+
+def run_window(integrator: Integrator, window_name: str, window_dimension: tuple, background_color: tuple,
+               profiler: Profiler = None):
+    """
+    Step the integrator once per displayed frame until the window is closed
+    :param profiler: optional profiler instrumenting the integrator, the drawing is timed as render
+    """
+    state = integrator.state
+    collider = integrator.collider
+
+    box_vertices, box_lines = box_wireframe(collider) if collider.num_boxes > 0 else (None, None)
+
+    window = ti.ui.Window(window_name, window_dimension, vsync=True)
+    canvas = window.get_canvas()
+    canvas.set_background_color(background_color)
+    scene = window.get_scene()
+    camera = ti.ui.Camera()
+
+    while window.running:
+        integrator.step()
+        with profiler.section("render") if profiler is not None else contextlib.nullcontext():
+            state.assign_vertices()
+
+            camera.position(0.0, 0.0, 3)
+            camera.lookat(0.0, 0.0, 0)
+            scene.set_camera(camera)
+
+            scene.point_light(pos=(0, 1, 2), color=(1, 1, 1))
+            scene.ambient_light((0.5, 0.5, 0.5))
+            scene.mesh(state.vertices,
+                       indices=state.triangles,
+                       per_vertex_color=state.colors,
+                       two_sided=True)
+
+            # Draw a smaller ball to avoid visual penetration
+            if collider.num_spheres > 0:
+                scene.particles(collider.sphere_center, radius=0.0, per_vertex_radius=collider.sphere_radius,
+                                index_count=collider.num_spheres)
+            if box_vertices is not None:
+                scene.lines(box_vertices, width=2, indices=box_lines)
+            canvas.scene(scene)
+            window.show()
+        if profiler is not None:
+            profiler.end_frame()
+    if profiler is not None:
+        profiler.close()
@@ -0,0 +1,97 @@
+import argparse
+import itertools
+import json
+import time
+
+import numpy as np
+import taichi as ti
+
+import cloth
+import headless
+
+"""
+Below is the batched run of many explicit cloth instances, e.g. for parameter studies
+"""
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Simulate a batch of explicit cloths in the same kernel launches")
+    parser.add_argument("--arch", choices=headless.arch_table.keys(), default="cpu",
+                        help="taichi backend used to run the simulation")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="max number of cpu threads, default to all cores")
+    parser.add_argument("--frames", type=int, default=100,
+                        help="number of frames to simulate")
+    parser.add_argument("--n", type=int, default=None,
+                        help="override number of vertices per side from metadata.py")
+    parser.add_argument("--num-substep", type=int, default=None,
+                        help="override num_substep from metadata.py")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a ClothConfig field shared by every instance")
+    parser.add_argument("--sweep", action="append", default=[], metavar="NAME=V1,V2,...",
+                        help=f"values of one of {', '.join(cloth.ensemble.instance_fields)}, "
+                             "the ensemble holds every combination of the swept values")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="copies of every combination, e.g. to measure the throughput of a large batch")
+    parser.add_argument("--output", type=str, default=None,
+                        help="path of the .npz file storing the parameters and final positions of every instance")
+    return parser.parse_args()
+
+
+def get_combinations(sweeps: list, repeat: int) -> dict:
+    """
+    Cartesian product of the swept values
+    :param sweeps: list of NAME=V1,V2,... items of --sweep
+    :param repeat: copies of every combination
+    :return: (batch,) array of the values of every swept field
+    """
+    names, values = [], []
+    for item in sweeps:
+        name, text = item.split("=", 1)
+        names.append(name)
+        values.append([float(value) for value in text.split(",")])
+    combinations = [combination for combination in itertools.product(*values) for _ in range(repeat)]
+    return {name: np.array([combination[k] for combination in combinations]) for k, name in enumerate(names)}
+
+
+def main():
+    args = parse_args()
+    if args.threads is None:
+        ti.init(arch=headless.arch_table[args.arch])
+    else:
+        ti.init(arch=headless.arch_table[args.arch], cpu_max_num_threads=args.threads)
+
+    values = {"n": args.n, "num_substep": args.num_substep}
+    values.update(headless.parse_settings(args.set))
+    config = cloth.ClothConfig.from_metadata(headless.load_metadata("explicit"), **values)
+    params = get_combinations(args.sweep, args.repeat)
+    batch = len(next(iter(params.values()))) if params else args.repeat
+    integrator = cloth.build_ensemble(config, batch, **params)
+    print(f"{batch} instances of {config.n} x {config.n} vertices")
+
+    # the first frame includes kernel compilation, time it separately
+    start_time = time.perf_counter()
+    integrator.step()
+    ti.sync()
+    print(f"first frame (with compile): {(time.perf_counter() - start_time) * 1000:.2f} ms")
+
+    start_time = time.perf_counter()
+    for frame in range(1, args.frames):
+        integrator.step()
+    ti.sync()
+    total_time = time.perf_counter() - start_time
+    if args.frames > 1:
+        print(f"simulated {args.frames - 1} frames in {total_time:.3f} s, {(args.frames - 1) / total_time:.2f} frames/s, "
+              f"{batch * (args.frames - 1) / total_time:.2f} instance frames/s")
+
+    x = integrator.state.x.to_numpy()
+    finite = np.isfinite(x).all(axis=(1, 2, 3))
+    if not finite.all():
+        print(f"{int((~finite).sum())} instances diverged: {json.dumps({k: v[~finite].tolist() for k, v in params.items()})}")
+    if args.output is not None:
+        params = integrator.params.to_numpy()
+        np.savez(args.output, x=x, **params)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import argparse
+import ast
+import importlib.util
+import os
+import time
+
+import numpy as np
+import taichi as ti
+
+import cloth
+
+"""
+Below are shared helpers to run the cloth demos without a window
+"""
+arch_table = {
+    "cpu": ti.cpu,
+    "vulkan": ti.vulkan,
+    "auto": ti.gpu,     # taichi falls back to cpu when no gpu backend is found
+}
+
+# folder holding the metadata.py of each solver
+solver_folder = {
+    "explicit": "Explicit Euler Approach",
+    "implicit": "Implicit Euler Approach",
+    "newton": "Implicit Euler Approach",
+    "pbd": "PBD Approach",
+    "pd": "Projective Dynamics Approach",
+}
+
+
+def parse_args(description: str, with_solver: bool = False, default_arch: str = "vulkan") -> argparse.Namespace:
+    """
+    Parse the command line options shared by every cloth demo
+    :param description: text shown on top of the --help message
+    :param with_solver: add the --solver option, used when not started from a solver folder
+    :param default_arch: backend used when --arch is not given
+    :return: parsed options, unset overrides are left as None
+    """
+    parser = argparse.ArgumentParser(description=description)
+    if with_solver:
+        parser.add_argument("--solver", choices=solver_folder.keys(), required=True,
+                            help="cloth integrator to run, setting is read from its metadata.py")
+    parser.add_argument("--arch", choices=arch_table.keys(), default=default_arch,
+                        help="taichi backend used to run the simulation")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="max number of cpu threads, default to all cores")
+    parser.add_argument("--headless", action="store_true",
+                        help="run without window as fast as possible")
+    parser.add_argument("--frames", type=int, default=1000,
+                        help="number of frames to simulate in headless mode")
+    parser.add_argument("--output", type=str, default=None,
+                        help="path of the .npy file storing per-frame positions in headless mode")
+    parser.add_argument("--n", type=int, default=None,
+                        help="override number of vertices per side from metadata.py")
+    parser.add_argument("--num-substep", type=int, default=None,
+                        help="override num_substep from metadata.py")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override any ClothConfig field, e.g. --set pbd_mode='gauss_seidel'")
+    parser.add_argument("--profile", action="store_true",
+                        help="time every kernel, count contacts and solver iterations, print a report at the end")
+    parser.add_argument("--profile-every", type=int, default=0, metavar="FRAMES",
+                        help="with --profile, also print the report of every FRAMES frames")
+    parser.add_argument("--trace", type=str, default=None,
+                        help="with --profile, write the timed calls to this Chrome trace .json")
+    parser.add_argument("--checkpoint", type=str, default=None,
+                        help="in headless mode, path of the snapshot of the cloth state written at the end")
+    parser.add_argument("--checkpoint-every", type=int, default=0, metavar="FRAMES",
+                        help="with --checkpoint, also overwrite the snapshot every FRAMES frames")
+    parser.add_argument("--restore", type=str, default=None,
+                        help="start from a snapshot written by --checkpoint instead of the flat cloth")
+    args = parser.parse_args()
+    # the first frame is always simulated, it is timed apart from the others
+    if args.frames < 1:
+        parser.error("--frames should be at least 1")
+    return args
+
+
+def overrides(args: argparse.Namespace) -> dict:
+    """
+    Collect the ClothConfig overrides given on command line
+    :param args: options returned by parse_args
+    :return: keyword arguments for ClothConfig.from_metadata
+    """
+    values = {"n": args.n, "num_substep": args.num_substep}
+    values.update(parse_settings(args.set))
+    return values
+
+
+def parse_settings(items: list) -> dict:
+    """
+    Parse NAME=VALUE items of --set, values are python literals
+    :param items: list of NAME=VALUE strings
+    :return: value of every name
+    """
+    values = {}
+    for item in items:
+        name, value = item.split("=", 1)
+        try:
+            values[name] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            values[name] = value    # bare words are taken as string
+    return values
+
+
+def init(args: argparse.Namespace):
+    """
+    Initialize taichi with the backend chosen on command line
+    :param args: options returned by parse_args
+    """
+    if args.threads is None:
+        ti.init(arch=arch_table[args.arch], kernel_profiler=args.profile)
+    else:
+        ti.init(arch=arch_table[args.arch], cpu_max_num_threads=args.threads, kernel_profiler=args.profile)
+
+
+def make_profiler(args: argparse.Namespace, integrator: cloth.Integrator) -> cloth.Profiler:
+    """
+    Instrument the integrator when --profile is given
+    :param args: options returned by parse_args
+    :param integrator: cloth integrator that has not stepped yet
+    :return: profiler of the integrator, None without --profile
+    """
+    if not args.profile:
+        return None
+    profiler = cloth.Profiler(args.profile_every, args.trace)
+    profiler.instrument(integrator)
+    return profiler
+
+
+def restore(args: argparse.Namespace, integrator: cloth.Integrator) -> int:
+    """
+    Load the snapshot given with --restore into the integrator
+    :param args: options returned by parse_args
+    :param integrator: cloth integrator that has not stepped yet
+    :return: frames simulated before the snapshot, 0 without --restore
+    """
+    if args.restore is None:
+        return 0
+    header = cloth.load_checkpoint(args.restore, integrator)
+    print(f"restored frame {header['frame']} at time {header['time']:.4f} s from {args.restore}")
+    return header["frame"]
+
+
+def load_metadata(solver: str):
+    """
+    Import the metadata.py module of a solver folder
+    :param solver: key of solver_folder
+    :return: imported metadata module
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), solver_folder[solver], "metadata.py")
+    spec = importlib.util.spec_from_file_location(f"metadata_{solver}", path)
+    metadata = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(metadata)
+    return metadata
+
+
+def run(integrator: cloth.Integrator, frames: int, output: str = None, profiler: cloth.Profiler = None,
+        checkpoint: str = None, checkpoint_every: int = 0, first_frame: int = 0) -> dict:
+    """
+    Advance the simulation for a fixed number of frames without any display
+    :param integrator: initialized cloth integrator
+    :param frames: number of frames to simulate, at least 1
+    :param output: optional .npy path, positions are stored with shape (frames, n, n, 3)
+    :param profiler: optional profiler instrumenting the integrator, its report is printed at the end
+    :param checkpoint: optional path of the snapshot of the state written at the end
+    :param checkpoint_every: also write the snapshot every checkpoint_every frames, 0 only at the end
+    :param first_frame: frames simulated before this run, e.g. by a restored snapshot
+    :return: dictionary of timing statistics
+    """
+    step, x = integrator.step, integrator.state.x
+    positions = None
+    if output is not None:
+        positions = np.lib.format.open_memmap(output, mode="w+", dtype=np.float32,
+                                              shape=(frames,) + tuple(x.shape) + (3,))
+
+    # the first frame includes kernel compilation, time it separately
+    start_time = time.perf_counter()
+    step()
+    ti.sync()
+    first_frame_time = time.perf_counter() - start_time
+    if positions is not None:
+        positions[0] = x.to_numpy()
+    if profiler is not None:
+        profiler.end_frame()
+
+    start_time = time.perf_counter()
+    for frame in range(1, frames):
+        step()
+        if positions is not None:
+            positions[frame] = x.to_numpy()
+        if profiler is not None:
+            profiler.end_frame()
+        # the last frame is written below
+        if checkpoint is not None and checkpoint_every > 0 and (frame + 1) % checkpoint_every == 0 \
+                and frame + 1 < frames:
+            cloth.save_checkpoint(checkpoint, integrator, first_frame + frame + 1)
+    ti.sync()
+    total_time = time.perf_counter() - start_time
+
+    if positions is not None:
+        positions.flush()
+    if checkpoint is not None:
+        cloth.save_checkpoint(checkpoint, integrator, first_frame + frames)
+        print(f"checkpoint of frame {first_frame + frames} written to {checkpoint}")
+
+    stats = {
+        "frames": frames,
+        "first_frame_time": first_frame_time,
+        "total_time": total_time,
+        "fps": (frames - 1) / total_time if frames > 1 else 0.0,
+    }
+    print(f"first frame (with compile): {first_frame_time * 1000:.2f} ms")
+    print(f"simulated {frames - 1} frames in {total_time:.3f} s, {stats['fps']:.2f} frames/s")
+
+    accelerator = getattr(integrator, "accelerator", None)
+    if accelerator is not None and accelerator.residuals:
+        stats["residuals"] = accelerator.residuals
+        print(f"chebyshev rho: {accelerator.rho}, residual per iteration of the last solve:")
+        print(" ".join(f"{residual:.3e}" for residual in accelerator.residuals))
+    if profiler is not None:
+        profiler.close()
+    return stats
+
+
+if __name__ == "__main__":
+    args = parse_args("Headless cloth simulation", with_solver=True)
+    metadata = load_metadata(args.solver)
+    init(args)
+
+    config = cloth.ClothConfig.from_metadata(metadata, **overrides(args))
+    integrator = cloth.build(config, args.solver)
+    first_frame = restore(args, integrator)
+    run(integrator, args.frames, args.output, make_profiler(args, integrator),
+        args.checkpoint, args.checkpoint_every, first_frame)
@@ -0,0 +1,175 @@
+import argparse
+import concurrent.futures
+import itertools
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+import headless
+
+"""
+Below is the parameter sweep driver, every combination of the grid is a headless run in a worker process
+"""
+# ti.init options of the worker process, set by init_worker
+worker_options = {}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run headless cloth simulations over a grid of parameters")
+    parser.add_argument("--grid", action="append", default=[], metavar="NAME=V1,V2,...",
+                        help="values of solver or of a ClothConfig field, e.g. --grid solver=explicit,pbd "
+                             "--grid n=32,64 --grid dt=1e-3,2e-3, every combination is run")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a ClothConfig field of every run")
+    parser.add_argument("--frames", type=int, default=100,
+                        help="number of frames of every run")
+    parser.add_argument("--warm-start", type=str, default=None,
+                        help="snapshot written by --checkpoint of a main.py or headless.py, e.g. a settled cloth, "
+                             "every run starts from it instead of the flat cloth")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes, default to one per --threads cores")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="cpu cores given to every worker, its process is pinned to them")
+    parser.add_argument("--arch", choices=headless.arch_table.keys(), default="cpu",
+                        help="taichi backend of the workers")
+    parser.add_argument("--cache", type=str, default=None,
+                        help="folder of the taichi offline kernel cache shared by the workers, "
+                             "default to the taichi one")
+    parser.add_argument("--output", type=str, default="sweep.npz",
+                        help="path of the .npz file receiving one column per parameter and metric, "
+                             "and the final positions of run k as state_k")
+    return parser.parse_args()
+
+
+def get_grid(items: list) -> list:
+    """
+    Cartesian product of the grid values
+    :param items: list of NAME=V1,V2,... items of --grid
+    :return: one dictionary of values per run
+    """
+    names, values = [], []
+    for item in items:
+        name, text = item.split("=", 1)
+        names.append(name)
+        values.append([headless.parse_settings([f"{name}={value}"])[name] for value in text.split(",")])
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def init_worker(cores: multiprocessing.Queue, threads: int, arch: str, cache: str):
+    """
+    Pin the worker process to its cores and choose the taichi options of its runs
+    """
+    worker_cores = cores.get()
+    if hasattr(os, "sched_setaffinity") and worker_cores:
+        os.sched_setaffinity(0, worker_cores)
+    worker_options.update(arch=headless.arch_table[arch], cpu_max_num_threads=threads, offline_cache=True)
+    if cache is not None:
+        worker_options["offline_cache_file_path"] = cache
+
+
+def run_case(index: int, params: dict, settings: dict, frames: int, warm_start: str = None) -> dict:
+    """
+    Simulate one combination of the grid in a worker
+    :return: record of the run, its metrics and final positions
+    """
+    import taichi as ti
+
+    import cloth
+    from benchmark import get_constraint_error
+
+    record = {"index": index, "worker": os.getpid()}
+    try:
+        # every run starts a fresh runtime so the fields of the previous one are freed,
+        # kernels compiled by any worker for the same setting are loaded from the offline cache
+        ti.init(**worker_options)
+        values = dict(settings)
+        values.update({name: value for name, value in params.items() if name != "solver"})
+        config = cloth.ClothConfig.from_metadata(headless.load_metadata(params["solver"]), **values)
+        record.update(n=config.n, dt=config.dt, num_substep=config.num_substep, spring_k=config.spring_k)
+
+        start_time = time.perf_counter()
+        integrator = cloth.build(config, params["solver"])
+        if warm_start is not None:
+            cloth.load_checkpoint(warm_start, integrator)
+        integrator.step()
+        ti.sync()
+        record["first_frame_time"] = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        for frame in range(1, frames):
+            integrator.step()
+        ti.sync()
+        total_time = time.perf_counter() - start_time
+
+        x = integrator.state.x.to_numpy()
+        mean_strain, max_strain = get_constraint_error(integrator.state)
+        record.update({
+            "ms_per_frame": 1000 * total_time / max(frames - 1, 1),
+            "sim_time": integrator.state.time,
+            "mean_strain": mean_strain,
+            "max_strain": max_strain,
+            "finite": bool(np.isfinite(x).all()),
+            "state": x,
+        })
+    except Exception as error:
+        record["error"] = f"{type(error).__name__}: {error}"
+    return record
+
+
+def main():
+    args = parse_args()
+    runs = get_grid(args.grid)
+    if not runs:
+        runs = [{}]
+    for params in runs:
+        params.setdefault("solver", "explicit")
+    settings = headless.parse_settings(args.set)
+
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count()))
+    num_workers = args.workers or max(len(cores) // args.threads, 1)
+    num_workers = min(num_workers, len(runs))
+    # spawn, taichi runtimes do not survive a fork
+    context = multiprocessing.get_context("spawn")
+    core_queue = context.Queue()
+    for k in range(num_workers):
+        chunk = cores[k * args.threads:(k + 1) * args.threads]
+        core_queue.put(set(chunk))
+    print(f"{len(runs)} runs on {num_workers} workers of {args.threads} cores")
+
+    records = [None] * len(runs)
+    start_time = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(num_workers, mp_context=context, initializer=init_worker,
+                                                initargs=(core_queue, args.threads, args.arch, args.cache)) as pool:
+        futures = {pool.submit(run_case, k, params, settings, args.frames, args.warm_start): k
+                   for k, params in enumerate(runs)}
+        for future in concurrent.futures.as_completed(futures):
+            record = future.result()
+            k = record["index"]
+            record.update(runs[k])
+            records[k] = record
+            text = record.get("error") or (f"{record['ms_per_frame']:.2f} ms/frame, "
+                                          f"max strain {record['max_strain']:.2e}"
+                                          + ("" if record["finite"] else ", diverged"))
+            print(f"[{k}] {runs[k]}: {text}")
+    print(f"{len(runs)} runs in {time.perf_counter() - start_time:.2f} s")
+
+    # one column per parameter and metric, missing values of failed runs are nan or empty
+    columns = {}
+    names = [name for record in records for name in record if name != "state"]
+    for name in dict.fromkeys(names):
+        values = [record.get(name) for record in records]
+        if all(isinstance(value, (bool, np.bool_)) or value is None for value in values):
+            columns[name] = np.array([bool(value) for value in values])
+        elif all(isinstance(value, (int, float)) or value is None for value in values):
+            columns[name] = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+        else:
+            columns[name] = np.array(["" if value is None else str(value) for value in values])
+    states = {f"state_{record['index']}": record["state"] for record in records if "state" in record}
+    np.savez(args.output, **columns, **states)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
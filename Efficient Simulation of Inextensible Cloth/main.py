@@ -14,22 +14,147 @@ vertices = ti.Vector.field(3, dtype=float, shape=n * n)
 colors = ti.Vector.field(3, dtype=float, shape=n * n)
 triangles = ti.field(dtype=int, shape=(n - 1) * (n - 1) * 6)
 
+inv_mass = ti.field(dtype=float, shape=(n, n))
+x_prev = ti.Vector.field(3, dtype=float, shape=(n, n))
+
+# one constraint per structural edge, index 2 * (i * n + j) is edge (i, j)-(i+1, j)
+# and index 2 * (i * n + j) + 1 is edge (i, j)-(i, j+1), entries past the border stay 0
 constraint = ti.field(dtype=float, shape=2*n*n)
-grad_constraint = ti.field(dtype=float, shape=2*n*n)
+# sparse constraint jacobian, each row only holds the gradient w.r.t. its second vertex
+# and the opposite gradient w.r.t. its first vertex
+grad_constraint = ti.Vector.field(3, dtype=float, shape=2*n*n)
+max_strain = ti.field(dtype=float, shape=())
+
+# conjugate gradient buffers for (dt^2 J M^-1 J^T) d_lambda = constraint
+d_lambda = ti.field(dtype=float, shape=2*n*n)
+diagonal = ti.field(dtype=float, shape=2*n*n)
+r = ti.field(dtype=float, shape=2*n*n)
+z = ti.field(dtype=float, shape=2*n*n)
+p = ti.field(dtype=float, shape=2*n*n)
+Ap = ti.field(dtype=float, shape=2*n*n)
+JTp = ti.Vector.field(3, dtype=float, shape=(n, n))
 
 
 @ti.func
-def compute_constraint():
+def edge_vertex(index: int) -> tm.ivec2:
+    """
+    Grid index of the second vertex of constraint index, the first one is (index // 2) // n, (index // 2) % n
+    """
+    i, j = (index // 2) // n, (index // 2) % n
+    return tm.ivec2(i + 1, j) if index % 2 == 0 else tm.ivec2(i, j + 1)
+
+
+@ti.kernel
+def compute_constraint() -> float:
+    """
+    Evaluate C = |x_b - x_a|^2 / l - l and its gradient for every structural edge
+    :return: maximum strain |x_b - x_a| / l - 1 over all edges
+    """
+    max_strain[None] = 0.0
+    for index in constraint:
+        constraint[index] = 0.0
+        grad_constraint[index] = tm.vec3(0.0)
+        a = tm.ivec2((index // 2) // n, (index // 2) % n)
+        b = edge_vertex(index)
+        if b[0] < n and b[1] < n:
+            x_diff = x[b] - x[a]
+            constraint[index] = x_diff.norm_sqr() / grid_interval - grid_interval
+            grad_constraint[index] = 2 * x_diff / grid_interval
+            ti.atomic_max(max_strain[None], abs(x_diff.norm() / grid_interval - 1))
+    return max_strain[None]
+
+
+@ti.kernel
+def multiply(src: ti.template(), dst: ti.template()):
+    """
+    dst = dt^2 J M^-1 J^T src
+    """
+    for i, j in JTp:
+        JTp[i, j] = tm.vec3(0.0)
+    for index in src:
+        a = tm.ivec2((index // 2) // n, (index // 2) % n)
+        b = edge_vertex(index)
+        if b[0] < n and b[1] < n:
+            JTp[a] -= grad_constraint[index] * src[index]
+            JTp[b] += grad_constraint[index] * src[index]
+    for index in dst:
+        dst[index] = 0.0
+        a = tm.ivec2((index // 2) // n, (index // 2) % n)
+        b = edge_vertex(index)
+        if b[0] < n and b[1] < n:
+            dst[index] = dt * dt * grad_constraint[index].dot(inv_mass[b] * JTp[b] - inv_mass[a] * JTp[a])
+
+
+@ti.kernel
+def dot(a: ti.template(), b: ti.template()) -> float:
+    result = 0.0
+    for index in a:
+        result += a[index] * b[index]
+    return result
+
+
+@ti.kernel
+def cg_init():
+    for index in constraint:
+        a = tm.ivec2((index // 2) // n, (index // 2) % n)
+        b = edge_vertex(index)
+        # jacobi preconditioner, rows past the border are left as identity
+        diagonal[index] = 1.0
+        if b[0] < n and b[1] < n:
+            diagonal[index] = dt * dt * (inv_mass[a] + inv_mass[b]) * grad_constraint[index].norm_sqr()
+        d_lambda[index] = 0.0
+        r[index] = constraint[index]
+        z[index] = r[index] / diagonal[index]
+        p[index] = z[index]
+
+
+@ti.kernel
+def cg_update(alpha: float):
+    for index in r:
+        d_lambda[index] += alpha * p[index]
+        r[index] -= alpha * Ap[index]
+        z[index] = r[index] / diagonal[index]
+
+
+@ti.kernel
+def cg_direction(beta: float):
+    for index in p:
+        p[index] = z[index] + beta * p[index]
+
+
+@ti.kernel
+def apply_projection():
+    """
+    x -= dt^2 M^-1 J^T d_lambda
+    """
+    for i, j in JTp:
+        JTp[i, j] = tm.vec3(0.0)
+    for index in d_lambda:
+        a = tm.ivec2((index // 2) // n, (index // 2) % n)
+        b = edge_vertex(index)
+        if b[0] < n and b[1] < n:
+            JTp[a] -= grad_constraint[index] * d_lambda[index]
+            JTp[b] += grad_constraint[index] * d_lambda[index]
     for i, j in x:
-        index = 2 * (i * n + j)
-        constraint[index] = grad_constraint[index] = 0
-        constraint[index + 1] = grad_constraint[index + 1] = 0
-        if i + 1 < n:
-            constraint[index] = (x[i + 1, j] - x[i, j]).norm_sqr() / grid_interval - grid_interval
-            grad_constraint[index] = 2 * (x[i + 1, j] - x[i, j]).norm() / grid_interval
-        if j + 1 < n:
-            constraint[index + 1] = (x[i, j + 1] - x[i, j + 1]).norm_sqr() / grid_interval - grid_interval
-            grad_constraint[index + 1] = 2 * (x[i, j + 1] - x[i, j + 1]).norm() / grid_interval
+        x[i, j] -= dt * dt * inv_mass[i, j] * JTp[i, j]
+
+
+def solve_constraint():
+    """
+    Jacobi preconditioned conjugate gradient on the constraint system
+    """
+    cg_init()
+    rz = dot(r, z)
+    threshold = cg_tolerance * cg_tolerance * dot(r, r)
+    for k in range(cg_iterations):
+        multiply(p, Ap)
+        alpha = rz / dot(p, Ap)
+        cg_update(alpha)
+        if dot(r, r) <= threshold:
+            break
+        rz_new = dot(r, z)
+        cg_direction(rz_new / rz)
+        rz = rz_new
 
 
 @ti.kernel
@@ -39,9 +164,13 @@ def init_cloth():
                    0.8,
                    j * grid_interval - 0.5 * grid_length]
         v[i, j] = [0, 0, 0]
+        inv_mass[i, j] = 1 / mass
 
     static_vertices[0] = x[0, 0]
     static_vertices[1] = x[n-1, 0]
+    # static vertices are never moved by the projection
+    inv_mass[0, 0] = 0
+    inv_mass[n-1, 0] = 0
 
     for i, j in ti.ndrange(n-1, n-1):
         index = 6 * (i * (n - 1) + j)
@@ -60,15 +189,30 @@ def init_cloth():
 @ti.kernel
 def update():
     for i, j in v:
-        v[i, j] *= damping
-        v[i, j] += gravity * dt / mass
-        x[i, j] += v[i, j] * dt
+        x_prev[i, j] = x[i, j]
+        if inv_mass[i, j] > 0:
+            v[i, j] *= damping
+            v[i, j] += gravity * dt / mass
+            x[i, j] += v[i, j] * dt
 
 
 @ti.kernel
+def update_velocity():
+    for i, j in v:
+        v[i, j] = (x[i, j] - x_prev[i, j]) / dt
+
+
 def fast_projection():
-    compute_constraint()
-    a = constraint.sum()
+    """
+    Goldenthal 2007 fast projection, project x onto the inextensibility constraints
+    until the maximum strain is below threshold
+    """
+    for k in range(max_projection):
+        if compute_constraint() < 0.01 * threshold:
+            break
+        solve_constraint()
+        apply_projection()
+    update_velocity()
 
 
 @ti.kernel
@@ -30,8 +30,12 @@ grid_interval = grid_length / n
 # mass matrix
 mass = 1
 
-# strain threshold
-threshold = 10
+# maximum strain of the fast projection, in percent
+threshold = 1
+# iteration limits of the fast projection and of its conjugate gradient solve
+max_projection = 10
+cg_iterations = 100
+cg_tolerance = 1e-4
 
 """
 Below are Sphere setting
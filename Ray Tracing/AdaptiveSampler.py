@@ -0,0 +1,94 @@
+import taichi as ti
+import taichi.math as tm
+
+from Film import Film, get_luminance
+
+TILE_SIZE = 16          # pixels per tile side, a tile converges or keeps sampling as a whole
+EPSILON = 0.01          # added to the mean luminance so the relative error of dark tiles stays finite
+
+
+@ti.data_oriented
+class AdaptiveSampler:
+    """
+    Spend the samples where the image is still noisy. The film keeps the luminance moments of every pixel,
+    update() turns them into the relative standard error of every tile and stops the tiles whose error fell
+    under threshold, the renderers then skip their pixels. A flat background converges after min_samples
+    while edges and indirect light keep sampling
+    """
+
+    def __init__(self, film: Film, threshold: float = 0.02, min_samples: int = 8, tile_size: int = TILE_SIZE):
+        """
+        :param film: film the renderer accumulates into
+        :param threshold: relative standard error of the mean under which a tile is converged
+        :param min_samples: samples every pixel gets before its tile can converge, the variance estimate
+        of fewer samples is not reliable
+        """
+        self.film = film
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.tile_size = tile_size
+        self.num_tile = tuple((k + tile_size - 1) // tile_size for k in film.resolution)
+        self.active = ti.field(dtype=ti.i32, shape=self.num_tile)
+        self.error = ti.field(dtype=float, shape=self.num_tile)
+        self.tile_samples = ti.field(dtype=ti.i32, shape=self.num_tile)
+        self.num_active = ti.field(dtype=ti.i32, shape=())
+
+    @ti.kernel
+    def reset(self):
+        """
+        Make every tile sample again, call it together with Film.reset
+        """
+        for I in ti.grouped(self.active):
+            self.active[I] = 1
+            self.error[I] = tm.inf
+            self.tile_samples[I] = 0
+        self.num_active[None] = self.num_tile[0] * self.num_tile[1]
+
+    @ti.func
+    def is_active(self, i: int, j: int) -> bool:
+        return self.active[i // self.tile_size, j // self.tile_size] != 0
+
+    @ti.kernel
+    def update(self) -> int:
+        """
+        Estimate the error of the active tiles and deactivate the converged ones
+        :return: number of tiles still active
+        """
+        self.num_active[None] = 0
+        for t in ti.grouped(self.active):
+            if self.active[t]:
+                samples = 0
+                min_count = 2 ** 30
+                mean = 0.0
+                standard_error = 0.0
+                num_pixel = 0
+                for k in ti.grouped(ti.ndrange(self.tile_size, self.tile_size)):
+                    i, j = t * self.tile_size + k
+                    if i < self.film.resolution[0] and j < self.film.resolution[1]:
+                        n = self.film.sample_count[i, j]
+                        samples += n
+                        min_count = min(min_count, n)
+                        if n > 0:
+                            average = get_luminance(self.film.accumulation[i, j]) / n
+                            variance = max(self.film.luminance_square[i, j] / n - average * average, 0.0)
+                            mean += average
+                            standard_error += ti.sqrt(variance / n)
+                        num_pixel += 1
+                self.tile_samples[t] = samples
+                self.error[t] = standard_error / (mean + EPSILON * num_pixel)
+                if min_count >= self.min_samples and self.error[t] < self.threshold:
+                    self.active[t] = 0
+                else:
+                    self.num_active[None] += 1
+        return self.num_active[None]
+
+    def get_stats(self) -> dict:
+        """
+        :return: samples of every tile, its error, its active flag and a summary of them
+        """
+        samples = self.tile_samples.to_numpy()
+        active = self.active.to_numpy()
+        return {"tile_samples": samples, "error": self.error.to_numpy(), "active": active,
+                "num_tile": active.size, "num_active": int(active.sum()),
+                "min_samples": int(samples.min()), "mean_samples": float(samples.mean()),
+                "max_samples": int(samples.max())}
@@ -0,0 +1,131 @@
+import numpy as np
+import taichi as ti
+import taichi.math as tm
+
+LEAF_SIZE = 4       # max number of object per leaf node
+STACK_SIZE = 64     # traversal stack, far beyond the depth of a median split tree
+
+
+@ti.dataclass
+class BVHNode:
+    lower:  tm.vec3
+    upper:  tm.vec3
+    child:  int     # index of the left child, the right child follows it. -1 for leaf node
+    start:  int     # leaf node only, first slot of its objects in BVH.indices
+    count:  int     # leaf node only, number of its objects
+
+    @ti.func
+    def get_distance(self, p: tm.vec3) -> float:
+        """
+        Distance from p to the node bound, 0 when p is inside
+        """
+        q = max(self.lower - p, p - self.upper)
+        return tm.length(max(q, 0.0))
+
+
+@ti.data_oriented
+class BVH:
+    """
+    Bounding volume hierarchy over the object bounds. The tree is built on the host by median split along
+    the longest axis and flattened into a field of BVHNode, leaf objects are stored in indices
+    """
+
+    def __init__(self, lower: np.ndarray, upper: np.ndarray):
+        """
+        :param lower: (num_object, 3) array of the lower corner of every object bound
+        :param upper: (num_object, 3) array of the upper corner of every object bound
+        """
+        self.num_object = len(lower)
+        nodes, order = self.split(lower, upper)
+        self.num_node = len(nodes)
+        self.nodes = BVHNode.field(shape=self.num_node)
+        self.indices = ti.field(dtype=int, shape=max(self.num_object, 1))
+        self.fill(nodes, order)
+
+    def split(self, lower: np.ndarray, upper: np.ndarray) -> (list, np.ndarray):
+        """
+        Median split the objects, the tree shape only depends on the number of objects
+        :return: node list of [lower, upper, child, start, count] and the object order of the leaves
+        """
+        nodes = []
+        order = np.arange(len(lower))
+        centers = 0.5 * (lower + upper)
+
+        # children are always appended in pairs
+        nodes.append([np.full(3, np.inf), np.full(3, -np.inf), -1, 0, 0])
+        stack = [(0, 0, len(lower))] if len(lower) > 0 else []
+        while stack:
+            node, start, end = stack.pop()
+            node_lower = lower[order[start:end]].min(axis=0)
+            node_upper = upper[order[start:end]].max(axis=0)
+            if end - start <= LEAF_SIZE:
+                nodes[node] = [node_lower, node_upper, -1, start, end - start]
+                continue
+
+            axis = np.argmax(node_upper - node_lower)
+            middle = (start + end) // 2
+            part = np.argpartition(centers[order[start:end], axis], middle - start)
+            order[start:end] = order[start:end][part]
+
+            child = len(nodes)
+            nodes.extend([None, None])
+            nodes[node] = [node_lower, node_upper, child, 0, 0]
+            stack.append((child, start, middle))
+            stack.append((child + 1, middle, end))
+        return nodes, order
+
+    def fill(self, nodes: list, order: np.ndarray):
+        self.nodes.from_numpy({
+            "lower":  np.array([node[0] for node in nodes], dtype=np.float32),
+            "upper":  np.array([node[1] for node in nodes], dtype=np.float32),
+            "child":  np.array([node[2] for node in nodes], dtype=np.int32),
+            "start":  np.array([node[3] for node in nodes], dtype=np.int32),
+            "count":  np.array([node[4] for node in nodes], dtype=np.int32),
+        })
+        if self.num_object > 0:
+            self.indices.from_numpy(order.astype(np.int32))
+
+    def rebuild(self, lower: np.ndarray, upper: np.ndarray):
+        """
+        Refit the tree to moved objects, the fields are reused so compiled kernels stay valid
+        """
+        assert len(lower) == self.num_object, "the number of objects can not change"
+        self.fill(*self.split(lower, upper))
+
+    @ti.func
+    def get_nearest(self, p: tm.vec3, scene: ti.template(), max_dist: float):
+        """
+        Nearest object to p, nodes whose bound is further than the current nearest distance are skipped.
+        The signed distance of an object is never below the distance to its bound when p is outside it,
+        nodes containing p are always visited since p may be inside their objects at any negative distance
+        :param p: query position
+        :param scene: scene the tree is built from, evaluates the distance of its objects
+        :param max_dist: distance returned when every object is further
+        :return: index of the nearest object (-1 when none is within max_dist) and its signed distance
+        """
+        dist = max_dist
+        nearest = -1
+        stack = ti.Vector([0] * STACK_SIZE)
+        top = 1
+        while top > 0:
+            top -= 1
+            node = self.nodes[stack[top]]
+            node_dist = node.get_distance(p)
+            if node_dist < dist or node_dist == 0:
+                if node.child < 0:
+                    for k in range(node.start, node.start + node.count):
+                        curr_dist = scene.get_object_distance(self.indices[k], p)
+                        if curr_dist < dist:
+                            dist = curr_dist
+                            nearest = self.indices[k]
+                else:
+                    # visit the closer child first, it is pushed last
+                    left = self.nodes[node.child].get_distance(p)
+                    right = self.nodes[node.child + 1].get_distance(p)
+                    near, far = node.child, node.child + 1
+                    if right < left:
+                        near, far = far, near
+                    stack[top] = far
+                    stack[top + 1] = near
+                    top += 2
+        return nearest, dist
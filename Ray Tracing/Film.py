@@ -0,0 +1,37 @@
+import taichi as ti
+import taichi.math as tm
+
+
+@ti.func
+def get_luminance(color: tm.vec3) -> float:
+    return color.dot(tm.vec3(0.2126, 0.7152, 0.0722))
+
+
+@ti.data_oriented
+class Film:
+    """
+    Progressive accumulation buffer, every sample is added to the running sum of its pixel and the image
+    keeps the average. The sum of the squared sample luminance gives the variance of every pixel.
+    reset() starts over, call it whenever the camera or the scene changes
+    """
+
+    def __init__(self, resolution: tuple):
+        self.resolution = resolution
+        self.accumulation = ti.Vector.field(3, dtype=ti.float32, shape=resolution)
+        self.sample_count = ti.field(dtype=ti.i32, shape=resolution)
+        self.luminance_square = ti.field(dtype=ti.float32, shape=resolution)
+        self.image = ti.Vector.field(3, dtype=ti.float32, shape=resolution)
+
+    @ti.kernel
+    def reset(self):
+        for i, j in self.accumulation:
+            self.accumulation[i, j] = tm.vec3(0.0)
+            self.sample_count[i, j] = 0
+            self.luminance_square[i, j] = 0.0
+
+    @ti.func
+    def add_sample(self, i: int, j: int, color: tm.vec3):
+        self.accumulation[i, j] += color
+        self.sample_count[i, j] += 1
+        self.luminance_square[i, j] += get_luminance(color) ** 2
+        self.image[i, j] = self.accumulation[i, j] / self.sample_count[i, j]
@@ -0,0 +1,89 @@
+import numpy as np
+import taichi as ti
+import taichi.math as tm
+
+
+@ti.func
+def get_closest_point(p: tm.vec3, a: tm.vec3, b: tm.vec3, c: tm.vec3) -> tm.vec3:
+    """
+    Point of triangle abc closest to p, Ericson "Real-Time Collision Detection" 5.1.5
+    """
+    ab, ac, ap = b - a, c - a, p - a
+    d1, d2 = ab.dot(ap), ac.dot(ap)
+    bp = p - b
+    d3, d4 = ab.dot(bp), ac.dot(bp)
+    cp = p - c
+    d5, d6 = ab.dot(cp), ac.dot(cp)
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+
+    closest = tm.vec3(0.0)
+    if d1 <= 0 and d2 <= 0:
+        closest = a
+    elif d3 >= 0 and d4 <= d3:
+        closest = b
+    elif vc <= 0 and d1 >= 0 and d3 <= 0:
+        closest = a + d1 / (d1 - d3) * ab
+    elif d6 >= 0 and d5 <= d6:
+        closest = c
+    elif vb <= 0 and d2 >= 0 and d6 <= 0:
+        closest = a + d2 / (d2 - d6) * ac
+    elif va <= 0 and d4 - d3 >= 0 and d5 - d6 >= 0:
+        closest = b + (d4 - d3) / ((d4 - d3) + (d5 - d6)) * (c - b)
+    else:
+        denominator = 1 / (va + vb + vc)
+        closest = a + vb * denominator * ab + vc * denominator * ac
+    return closest
+
+
+@ti.data_oriented
+class MeshTable:
+    """
+    Triangle meshes shared by every object instancing them, each mesh is stored once whatever the
+    number of its instances. add() every mesh on the host then build() packs them into fields.
+    A mesh object is the shell of its triangles, thick of the object params.x
+    """
+
+    def __init__(self):
+        self.vertex_list = []
+        self.bounds = []
+        self.num_mesh = 0
+        self.num_triangle = 0
+
+    def add(self, vertices: np.ndarray, faces: np.ndarray) -> int:
+        """
+        :param vertices: (num_vertex, 3) vertex positions in the mesh frame
+        :param faces: (num_face, 3) vertex indices of every triangle
+        :return: index of the mesh, to set as Object.mesh
+        """
+        vertices = np.asarray(vertices, dtype=np.float32)
+        self.vertex_list.append(vertices[np.asarray(faces)])
+        self.bounds.append((vertices.min(axis=0), vertices.max(axis=0)))
+        self.num_mesh += 1
+        return self.num_mesh - 1
+
+    def build(self):
+        triangles = np.concatenate(self.vertex_list) if self.vertex_list else np.zeros((1, 3, 3), np.float32)
+        counts = np.array([len(v) for v in self.vertex_list] or [0], dtype=np.int32)
+        self.num_triangle = len(triangles)
+        self.triangles = ti.Vector.field(3, dtype=float, shape=(self.num_triangle, 3))
+        self.start = ti.field(dtype=ti.i32, shape=max(self.num_mesh, 1))
+        self.count = ti.field(dtype=ti.i32, shape=max(self.num_mesh, 1))
+        self.triangles.from_numpy(triangles)
+        self.start.from_numpy(np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int32))
+        self.count.from_numpy(counts)
+
+    @ti.func
+    def get_closest_point(self, mesh: int, p: tm.vec3) -> tm.vec3:
+        """
+        Closest point to p on the triangles of the mesh, every triangle is tested
+        """
+        closest = tm.vec3(1e9)
+        dist = 1e9
+        for t in range(self.start[mesh], self.start[mesh] + self.count[mesh]):
+            q = get_closest_point(p, self.triangles[t, 0], self.triangles[t, 1], self.triangles[t, 2])
+            if (p - q).norm() < dist:
+                dist = (p - q).norm()
+                closest = q
+        return closest
@@ -1,44 +1,266 @@
+import numpy as np
 import taichi as ti
 import taichi.math as tm
 
 SHAPE_SPHERE = 1
 SHAPE_CUBE = 2
+SHAPE_PLANE = 3
+SHAPE_TORUS = 4
+SHAPE_CAPSULE = 5
+SHAPE_MESH = 6
+# shapes compiled by default, a scene passes only the ones it holds so the others are never compiled
+ALL_SHAPES = (SHAPE_SPHERE, SHAPE_CUBE, SHAPE_PLANE, SHAPE_TORUS, SHAPE_CAPSULE, SHAPE_MESH)
+SHAPE_NAMES = {"sphere": SHAPE_SPHERE, "cube": SHAPE_CUBE, "plane": SHAPE_PLANE, "torus": SHAPE_TORUS,
+               "capsule": SHAPE_CAPSULE, "mesh": SHAPE_MESH}
+
+MATERIAL_DIFFUSE = 0
+MATERIAL_METAL = 1
+MATERIAL_DIELECTRIC = 2
+MATERIAL_NAMES = {"diffuse": MATERIAL_DIFFUSE, "metal": MATERIAL_METAL, "dielectric": MATERIAL_DIELECTRIC}
+
+# half extent of the bound given to the infinite plane
+PLANE_EXTENT = 1e4
+# shapes whose bound is only a stand-in for an infinite extent, kept out of the region of the SDF cache
+UNBOUNDED_SHAPES = (SHAPE_PLANE,)
 
 
 @ti.dataclass
 class Material:
-    albedo: tm.vec3
+    albedo:    tm.vec3
+    emission:  tm.vec3     # radiance emitted by the surface, any non zero value makes the object a light
+    type:      ti.u8
+    roughness: float       # metal only, 0 for a perfect mirror
+    ior:       float       # dielectric only, index of refraction
 
 
 @ti.dataclass
 class Transform:
     position: tm.vec3
-    rotation: tm.vec4   # use quaterion
-    scale:    tm.vec3
+    rotation: tm.vec4   # use quaterion (x, y, z, w), left to zero means no rotation
+    scale:    tm.vec3   # left to zero means unit scale
+
+    @ti.func
+    def get_rotation(self) -> tm.vec4:
+        q = tm.vec4(0.0, 0.0, 0.0, 1.0)
+        if self.rotation.norm() > 0:
+            q = tm.normalize(self.rotation)
+        return q
+
+    @ti.func
+    def get_scale(self) -> tm.vec3:
+        return ti.select(self.scale != 0, self.scale, 1.0)
+
+    @ti.func
+    def get_min_scale(self) -> float:
+        scale = self.get_scale()
+        return min(scale.x, scale.y, scale.z)
+
+    @ti.func
+    def to_local(self, p: tm.vec3) -> tm.vec3:
+        return rotate(conjugate(self.get_rotation()), p - self.position) / self.get_scale()
+
+    @ti.func
+    def normal_to_world(self, normal: tm.vec3) -> tm.vec3:
+        """
+        Normal of the local shape back to world, a non uniform scale bends it by the inverse scale
+        """
+        return tm.normalize(rotate(self.get_rotation(), normal / self.get_scale()))
+
+
+@ti.func
+def conjugate(q: tm.vec4) -> tm.vec4:
+    return tm.vec4(-q.x, -q.y, -q.z, q.w)
+
+
+@ti.func
+def rotate(q: tm.vec4, v: tm.vec3) -> tm.vec3:
+    u = q.xyz
+    t = 2 * tm.cross(u, v)
+    return v + q.w * t + tm.cross(u, t)
+
+
+@ti.func
+def get_segment_distance(p: tm.vec3, a: tm.vec3, b: tm.vec3) -> float:
+    ab = b - a
+    h = tm.clamp((p - a).dot(ab) / ab.dot(ab), 0.0, 1.0)
+    return tm.length(p - a - h * ab)
 
 
 @ti.dataclass
 class Object:
     material:   Material
     transform:  Transform
-    params:     float       # for sphere use for radius, for cube use for length
+    params:     tm.vec2     # sphere: radius, cube: half length, torus: major and minor radius,
+                            # capsule: half height and radius, mesh: shell thickness
     type:       ti.u8
+    mesh:       ti.i32      # mesh only, index of the shared mesh in the MeshTable
 
     @ti.func
-    def get_signed_distance(self, p: tm.vec3) -> float:
+    def get_local_distance(self, p: tm.vec3, shapes: ti.template() = ALL_SHAPES) -> float:
+        """
+        Signed distance of the analytic shapes in their local frame
+        :param shapes: shape types that can occur, the branches of the other types are not compiled
+        """
         signed_distance = 0.0
-        if self.type == SHAPE_SPHERE:
-            signed_distance = tm.length(self.transform.position - p) - self.params
-        elif self.type == SHAPE_CUBE:
-            q = abs(p - self.transform.position) - self.params
+        if ti.static(SHAPE_SPHERE in shapes) and self.type == SHAPE_SPHERE:
+            signed_distance = tm.length(p) - self.params.x
+        if ti.static(SHAPE_CUBE in shapes) and self.type == SHAPE_CUBE:
+            q = abs(p) - self.params.x
             signed_distance = tm.length(max(q, 0.0)) + min(max(q.x, q.y, q.z), 0.0)
+        if ti.static(SHAPE_PLANE in shapes) and self.type == SHAPE_PLANE:
+            signed_distance = p.y
+        if ti.static(SHAPE_TORUS in shapes) and self.type == SHAPE_TORUS:
+            q = tm.vec2(tm.length(p.xz) - self.params.x, p.y)
+            signed_distance = tm.length(q) - self.params.y
+        if ti.static(SHAPE_CAPSULE in shapes) and self.type == SHAPE_CAPSULE:
+            a, b = tm.vec3(0.0, -self.params.x, 0.0), tm.vec3(0.0, self.params.x, 0.0)
+            signed_distance = get_segment_distance(p, a, b) - self.params.y
         return signed_distance
 
     @ti.func
-    def get_normal(self, p: tm.vec3) -> tm.vec3:
+    def get_local_normal(self, p: tm.vec3, shapes: ti.template() = ALL_SHAPES) -> tm.vec3:
+        """
+        Analytic gradient of the signed distance of the analytic shapes in their local frame
+        """
+        normal = tm.vec3(0.0, 1.0, 0.0)
+        if ti.static(SHAPE_SPHERE in shapes) and self.type == SHAPE_SPHERE:
+            normal = tm.normalize(p)
+        if ti.static(SHAPE_CUBE in shapes) and self.type == SHAPE_CUBE:
+            q = abs(p) - self.params.x
+            outside = max(q, 0.0)
+            if outside.norm() > 0:
+                normal = tm.sign(p) * outside / outside.norm()
+            else:
+                # inside, the nearest face decides
+                axis = 0
+                if q.y >= q.x and q.y >= q.z:
+                    axis = 1
+                elif q.z >= q.x and q.z >= q.y:
+                    axis = 2
+                normal = tm.vec3(0.0)
+                normal[axis] = tm.sign(p[axis])
+        if ti.static(SHAPE_TORUS in shapes) and self.type == SHAPE_TORUS:
+            ring = tm.normalize(tm.vec3(p.x, 0.0, p.z)) * self.params.x
+            normal = tm.normalize(p - ring)
+        if ti.static(SHAPE_CAPSULE in shapes) and self.type == SHAPE_CAPSULE:
+            normal = tm.normalize(p - tm.vec3(0.0, tm.clamp(p.y, -self.params.x, self.params.x), 0.0))
+        return normal
+
+    @ti.func
+    def get_signed_distance(self, p: tm.vec3, shapes: ti.template() = ALL_SHAPES) -> float:
+        """
+        Signed distance of an analytic shape, a non uniform scale gives a lower bound of it.
+        Meshes need their MeshTable, use Scene.get_object_distance
+        """
+        return self.get_local_distance(self.transform.to_local(p), shapes) * self.transform.get_min_scale()
+
+    @ti.func
+    def get_normal(self, p: tm.vec3, shapes: ti.template() = ALL_SHAPES) -> tm.vec3:
+        """
+        Analytic gradient of the signed distance, no extra SDF evaluation
+        """
+        return self.transform.normal_to_world(self.get_local_normal(self.transform.to_local(p), shapes))
+
+    @ti.func
+    def get_numerical_normal(self, p: tm.vec3, shapes: ti.template() = ALL_SHAPES) -> tm.vec3:
+        """
+        Gradient of the signed distance by the four-tap tetrahedron finite difference
+        """
         epsilon = tm.vec2(1, -1)
-        normal = epsilon.xyy * self.get_signed_distance(p + epsilon.xyy * 0.0001) + \
-                 epsilon.yyx * self.get_signed_distance(p + epsilon.yyx * 0.0001) + \
-                 epsilon.yxy * self.get_signed_distance(p + epsilon.yxy * 0.0001) + \
-                 epsilon.xxx * self.get_signed_distance(p + epsilon.xxx * 0.0001)
+        normal = epsilon.xyy * self.get_signed_distance(p + epsilon.xyy * 0.0001, shapes) + \
+                 epsilon.yyx * self.get_signed_distance(p + epsilon.yyx * 0.0001, shapes) + \
+                 epsilon.yxy * self.get_signed_distance(p + epsilon.yxy * 0.0001, shapes) + \
+                 epsilon.xxx * self.get_signed_distance(p + epsilon.xxx * 0.0001, shapes)
         return tm.normalize(normal)
+
+
+def new_table(num_object: int) -> dict:
+    """
+    Zeroed struct of arrays with the layout of Object, filled on the host then loaded in one from_numpy
+    """
+    return {
+        "material": {"albedo": np.zeros((num_object, 3), np.float32),
+                     "emission": np.zeros((num_object, 3), np.float32),
+                     "type": np.zeros(num_object, np.uint8),
+                     "roughness": np.zeros(num_object, np.float32),
+                     "ior": np.zeros(num_object, np.float32)},
+        "transform": {"position": np.zeros((num_object, 3), np.float32),
+                      "rotation": np.zeros((num_object, 4), np.float32),
+                      "scale": np.zeros((num_object, 3), np.float32)},
+        "params": np.zeros((num_object, 2), np.float32),
+        "type": np.zeros(num_object, np.uint8),
+        "mesh": np.zeros(num_object, np.int32),
+    }
+
+
+def pack(objects: list) -> dict:
+    """
+    Struct of arrays of a list of Object
+    """
+    table = new_table(len(objects))
+    for i, obj in enumerate(objects):
+        set_row(table, i, obj)
+    return table
+
+
+def set_row(table: dict, index: int, obj):
+    """
+    Copy an Object, or any struct with the same members, into row index of table
+    """
+    for key, column in table.items():
+        if isinstance(column, dict):
+            set_row(column, index, getattr(obj, key))
+        else:
+            column[index] = np.array(getattr(obj, key), dtype=column.dtype).reshape(column.shape[1:])
+
+
+def get_local_bounds(table: dict, mesh_bounds: list = None) -> (np.ndarray, np.ndarray):
+    """
+    Bound of every shape of the table in its local frame, evaluated on the host
+    :param mesh_bounds: (lower, upper) of every mesh of the MeshTable, needed by mesh objects
+    """
+    shape, params = table["type"], table["params"].astype(np.float64)
+    upper = np.zeros((len(shape), 3))
+    unknown = set(shape.tolist()) - set(ALL_SHAPES)
+    if unknown:
+        raise ValueError(f"unknown shape type {min(unknown)}")
+
+    is_box = (shape == SHAPE_SPHERE) | (shape == SHAPE_CUBE)
+    upper[is_box] = params[is_box, :1]
+    upper[shape == SHAPE_PLANE] = [PLANE_EXTENT, PLANE_EXTENT, PLANE_EXTENT]
+    torus = params[shape == SHAPE_TORUS]
+    upper[shape == SHAPE_TORUS] = np.stack([torus.sum(axis=1), torus[:, 1], torus.sum(axis=1)], axis=1)
+    capsule = params[shape == SHAPE_CAPSULE]
+    upper[shape == SHAPE_CAPSULE] = np.stack([capsule[:, 1], capsule.sum(axis=1), capsule[:, 1]], axis=1)
+    lower = -upper
+    # the plane is the half-space below y = 0, only its upper bound is the surface
+    upper[shape == SHAPE_PLANE, 1] = 0
+
+    for k in np.flatnonzero(shape == SHAPE_MESH):
+        mesh_lower, mesh_upper = mesh_bounds[table["mesh"][k]]
+        lower[k], upper[k] = mesh_lower - params[k, 0], mesh_upper + params[k, 0]
+    return lower, upper
+
+
+def get_bounds(table: dict, mesh_bounds: list = None) -> (np.ndarray, np.ndarray):
+    """
+    Axis aligned world bound of every object of the table, evaluated on the host
+    :param mesh_bounds: (lower, upper) of every mesh of the MeshTable, needed by mesh objects
+    :return: (num_object, 3) lower and upper corners of the bounds
+    """
+    lower, upper = get_local_bounds(table, mesh_bounds)
+    transform = table["transform"]
+    scale = transform["scale"].astype(np.float64)
+    scale[scale == 0] = 1
+    q = transform["rotation"].astype(np.float64)
+    norm = np.linalg.norm(q, axis=1, keepdims=True)
+    q = np.where(norm > 0, q / np.where(norm > 0, norm, 1), [0, 0, 0, 1.0])
+
+    # rotate the 8 corners of the scaled local bounds
+    corners = np.stack([np.where([k >> m & 1 for m in range(3)], upper, lower) for k in range(8)], axis=1)
+    corners *= scale[:, None]
+    u, w = q[:, None, :3], q[:, None, 3:]
+    t = 2 * np.cross(u, corners)
+    corners = corners + w * t + np.cross(u, t)
+    position = transform["position"][:, None].astype(np.float64)
+    return (corners + position).min(axis=1), (corners + position).max(axis=1)
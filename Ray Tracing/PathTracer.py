@@ -0,0 +1,324 @@
+import json
+import time
+
+import numpy as np
+import taichi as ti
+import taichi.math as tm
+
+import Object
+from AdaptiveSampler import AdaptiveSampler
+from Camera import Camera
+from Film import Film
+from Ray import Ray, RayHitRecord, MIN_TIME, MAX_RAYMARCHING
+from RayQueue import RayQueue
+
+SURFACE_OFFSET = 0.001  # new rays leave this far from the surface so they do not hit it again right away
+MARCH_STEP = 32         # march steps per launch of the march stage, finished rays are compacted away in between
+
+
+@ti.func
+def get_local_direction(normal: tm.vec3, cos_theta: float, phi: float) -> tm.vec3:
+    """
+    Direction making angle acos(cos_theta) with normal, rotated by phi around it
+    """
+    sin_theta = ti.sqrt(max(0.0, 1 - cos_theta * cos_theta))
+    helper = tm.vec3(1, 0, 0) if abs(normal.x) < 0.9 else tm.vec3(0, 1, 0)
+    tangent = tm.normalize(tm.cross(helper, normal))
+    bitangent = tm.cross(normal, tangent)
+    return sin_theta * tm.cos(phi) * tangent + sin_theta * tm.sin(phi) * bitangent + cos_theta * normal
+
+
+@ti.func
+def get_random_unit_vector() -> tm.vec3:
+    return get_local_direction(tm.vec3(0, 0, 1), 1 - 2 * ti.random(), 2 * tm.pi * ti.random())
+
+
+@ti.func
+def get_cosine_direction(normal: tm.vec3) -> tm.vec3:
+    return get_local_direction(normal, ti.sqrt(ti.random()), 2 * tm.pi * ti.random())
+
+
+def get_sphere_lights(table: dict) -> np.ndarray:
+    """
+    Indices of the emissive spheres left round by their scale, the only lights next event estimation can sample
+    :param table: object table of the scene
+    """
+    scale = np.where(table["transform"]["scale"] != 0, table["transform"]["scale"], 1)
+    round_scale = (scale == scale[:, :1]).all(axis=1)
+    emissive = table["material"]["emission"].max(axis=1) > 0
+    return np.flatnonzero((table["type"] == Object.SHAPE_SPHERE) & round_scale & emissive).astype(np.int32)
+
+
+@ti.data_oriented
+class PathTracer:
+    """
+    Wavefront path tracing with diffuse, metal and dielectric materials, Russian roulette and next event
+    estimation toward the emissive spheres. The state of every path lives in fields indexed by pixel, every
+    bounce runs one kernel per stage over a queue of ray indices:
+    - march: advance every unfinished ray by MARCH_STEP steps, then compact away the finished ones
+    - shade: turn the hit of every ray of the bounce into emission, direct light and the next ray direction,
+      then compact away the terminated paths
+    so lanes never wait for the slowest ray of their neighbors.
+    With an AdaptiveSampler only the pixels of its active tiles start a path
+    """
+
+    def __init__(self, scene, film: Film, max_bounce: int = 8, rr_depth: int = 3,
+                 sky: tm.vec3 = tm.vec3(1.0), report: bool = False, sampler: AdaptiveSampler = None):
+        """
+        :param scene: scene to render
+        :param film: film receiving one sample per pixel and render() call
+        :param max_bounce: max number of surfaces a path can hit
+        :param rr_depth: bounce from which paths are randomly terminated by Russian roulette
+        :param sky: radiance of the sky at zenith, the horizon is white
+        :param report: synchronize after every stage, sum its time into timing, keep it as a trace event and
+        count the march steps of every ray
+        :param sampler: adaptive sampler deciding which pixels get a sample
+        """
+        self.scene = scene
+        self.film = film
+        self.max_bounce = max_bounce
+        self.rr_depth = rr_depth
+        self.sky = sky
+        self.report = report
+        self.sampler = sampler
+        self.use_sampler = sampler is not None
+        self.timing = {"generate": 0.0, "march": 0.0, "shade": 0.0, "compact": 0.0, "accumulate": 0.0}
+        self.events = []
+        self.trace_start = time.perf_counter()
+        # rays marched (one per path and bounce) and march steps they took, counted with report
+        self.num_segment = ti.field(dtype=ti.i64, shape=())
+        self.num_march_step = ti.field(dtype=ti.i64, shape=())
+
+        self.height = film.resolution[1]
+        num_ray = film.resolution[0] * film.resolution[1]
+        self.origin = ti.Vector.field(3, dtype=float, shape=num_ray)
+        self.direction = ti.Vector.field(3, dtype=float, shape=num_ray)
+        self.throughput = ti.Vector.field(3, dtype=float, shape=num_ray)
+        self.radiance = ti.Vector.field(3, dtype=float, shape=num_ray)
+        self.alive = ti.field(dtype=ti.i32, shape=num_ray)
+        # last bounce was specular, next event estimation could not sample it so a light hit is counted
+        self.specular = ti.field(dtype=ti.i32, shape=num_ray)
+
+        # march state of the current bounce
+        self.time = ti.field(dtype=float, shape=num_ray)
+        self.hit_index = ti.field(dtype=ti.i32, shape=num_ray)
+        self.marching = ti.field(dtype=ti.i32, shape=num_ray)
+
+        # paths alive at the current bounce and the rays still marching, both double buffered for compaction
+        self.path_queues = [RayQueue(num_ray), RayQueue(num_ray)]
+        self.march_queues = [RayQueue(num_ray), RayQueue(num_ray)]
+
+        # emissive spheres are sampled by next event estimation, other lights are only found by chance
+        lights = get_sphere_lights(scene.table)
+        self.num_light = len(lights)
+        self.lights = ti.field(dtype=int, shape=max(self.num_light, 1))
+        if self.num_light > 0:
+            self.lights.from_numpy(lights)
+
+    @ti.func
+    def get_background(self, direction: tm.vec3) -> tm.vec3:
+        t = 0.5 * (direction.y + 1)
+        return (1 - t) * tm.vec3(1.0) + t * self.sky
+
+    @ti.func
+    def is_light_sampled(self, obj: Object.Object) -> bool:
+        scale = obj.transform.get_scale()
+        return ti.static(self.num_light > 0) and obj.type == Object.SHAPE_SPHERE and \
+            scale.x == scale.y and scale.y == scale.z
+
+    @ti.func
+    def sample_light(self, p: tm.vec3, normal: tm.vec3) -> tm.vec3:
+        """
+        Direct light reaching p from one random emissive sphere, sampled uniformly in the cone it subtends.
+        The diffuse brdf is included except for the albedo
+        """
+        result = tm.vec3(0.0)
+        k = self.lights[min(int(ti.random() * self.num_light), self.num_light - 1)]
+        light = self.scene.objects[k]
+        to_light = light.transform.position - p
+        dist2 = to_light.dot(to_light)
+        radius = light.params.x * light.transform.get_min_scale()
+        radius2 = radius * radius
+        if dist2 > radius2:
+            cos_max = ti.sqrt(1 - radius2 / dist2)
+            direction = get_local_direction(tm.normalize(to_light), 1 - ti.random() * (1 - cos_max),
+                                            2 * tm.pi * ti.random())
+            cos_normal = direction.dot(normal)
+            if cos_normal > 0:
+                shadow = Ray(position=p, direction=direction, color=tm.vec4(1.0)).raycast(self.scene, 0.0)
+                if shadow.hit and shadow.hit_index == k:
+                    # brdf albedo / pi, pdf 1 / solid angle of the cone, one light picked out of num_light
+                    solid_angle = 2 * tm.pi * (1 - cos_max)
+                    result = light.material.emission * cos_normal / tm.pi * solid_angle * self.num_light
+        return result
+
+    @ti.kernel
+    def generate(self, camera: Camera):
+        resolution = ti.static(self.film.resolution)
+        for r in self.alive:
+            i, j = r // self.height, r % self.height
+            u = (i + ti.random()) / resolution[0]
+            v = (j + ti.random()) / resolution[1]
+            ray = camera.get_ray(u, v, tm.vec4(1.0))
+            self.origin[r] = ray.at(MIN_TIME)
+            self.direction[r] = ray.direction
+            self.throughput[r] = tm.vec3(1.0)
+            self.radiance[r] = tm.vec3(0.0)
+            self.alive[r] = 1
+            if ti.static(self.use_sampler):
+                self.alive[r] = ti.cast(self.sampler.is_active(i, j), ti.i32)
+            self.specular[r] = 1
+
+    @ti.kernel
+    def start_march(self, queue: ti.template()):
+        for q in range(queue.length[None]):
+            r = queue.items[q]
+            self.time[r] = 0.0
+            self.hit_index[r] = -1
+            self.marching[r] = 1
+            if ti.static(self.report):
+                self.num_segment[None] += 1
+
+    @ti.kernel
+    def march(self, queue: ti.template()):
+        for q in range(queue.length[None]):
+            r = queue.items[q]
+            ray = Ray(position=self.origin[r], direction=self.direction[r], color=tm.vec4(1.0))
+            record = RayHitRecord(position=ray.position, time=self.time[r], hit=False, finished=False,
+                                  hit_index=-1)
+            record = ray.march(self.scene, record, MARCH_STEP)
+            if ti.static(self.report):
+                self.num_march_step[None] += record.num_step
+            self.time[r] = record.time
+            self.hit_index[r] = record.hit_index
+            if record.finished:
+                self.marching[r] = 0
+
+    @ti.kernel
+    def shade(self, queue: ti.template(), depth: int):
+        for q in range(queue.length[None]):
+            r = queue.items[q]
+            direction = self.direction[r]
+            if self.hit_index[r] < 0:
+                self.radiance[r] += self.throughput[r] * self.get_background(direction)
+                self.alive[r] = 0
+            else:
+                obj = self.scene.objects[self.hit_index[r]]
+                material = obj.material
+                p = self.origin[r] + self.time[r] * direction
+                normal = self.scene.get_normal(self.hit_index[r], p)
+                front_face = direction.dot(normal) < 0
+                if not front_face:
+                    normal = -normal
+                if self.specular[r] or not self.is_light_sampled(obj):
+                    self.radiance[r] += self.throughput[r] * material.emission
+
+                throughput = self.throughput[r] * material.albedo
+                if material.type == Object.MATERIAL_DIFFUSE:
+                    if ti.static(self.num_light > 0):
+                        light = self.sample_light(p + SURFACE_OFFSET * normal, normal)
+                        self.radiance[r] += throughput * light
+                    self.origin[r] = p + SURFACE_OFFSET * normal
+                    self.direction[r] = get_cosine_direction(normal)
+                    self.specular[r] = 0
+                elif material.type == Object.MATERIAL_METAL:
+                    reflected = tm.normalize(tm.reflect(direction, normal)
+                                             + material.roughness * get_random_unit_vector())
+                    if reflected.dot(normal) <= 0:
+                        self.alive[r] = 0
+                    self.origin[r] = p + SURFACE_OFFSET * normal
+                    self.direction[r] = reflected
+                    self.specular[r] = 1
+                else:
+                    eta = 1 / material.ior if front_face else material.ior
+                    cos_i = min(-direction.dot(normal), 1.0)
+                    sin_t2 = eta * eta * (1 - cos_i * cos_i)
+                    # Schlick approximation of the Fresnel reflectance
+                    r0 = (1 - material.ior) / (1 + material.ior)
+                    reflectance = r0 * r0 + (1 - r0 * r0) * (1 - cos_i) ** 5
+                    if sin_t2 > 1 or ti.random() < reflectance:
+                        self.origin[r] = p + SURFACE_OFFSET * normal
+                        self.direction[r] = tm.reflect(direction, normal)
+                    else:
+                        self.origin[r] = p - SURFACE_OFFSET * normal
+                        self.direction[r] = tm.normalize(tm.refract(direction, normal, eta))
+                    self.specular[r] = 1
+
+                if depth >= self.rr_depth:
+                    survive = min(throughput.max(), 0.95)
+                    if ti.random() >= survive:
+                        self.alive[r] = 0
+                    throughput /= survive
+                self.throughput[r] = throughput
+
+    @ti.kernel
+    def accumulate(self):
+        for r in self.radiance:
+            i, j = r // self.height, r % self.height
+            if ti.static(self.use_sampler):
+                if not self.sampler.is_active(i, j):
+                    continue
+            self.film.add_sample(i, j, self.radiance[r])
+
+    def run_stage(self, name: str, stage, *args):
+        if self.report:
+            ti.sync()
+            start = time.perf_counter()
+            stage(*args)
+            ti.sync()
+            end = time.perf_counter()
+            self.timing[name] += end - start
+            self.events.append((name, start - self.trace_start, end - start))
+        else:
+            stage(*args)
+
+    def render(self, camera: Camera):
+        paths, next_paths = self.path_queues
+        self.run_stage("generate", self.generate, camera)
+        if self.use_sampler:
+            # only the pixels of the active tiles start a path
+            next_paths.fill()
+            self.run_stage("compact", paths.compact, next_paths, self.alive)
+        else:
+            paths.fill()
+        for depth in range(self.max_bounce):
+            if paths.length[None] == 0:
+                break
+            # march every ray of the bounce, dropping the finished ones between launches
+            marching, next_marching = self.march_queues
+            self.start_march(paths)
+            self.run_stage("compact", marching.compact, paths, self.alive)
+            for step in range(0, MAX_RAYMARCHING, MARCH_STEP):
+                self.run_stage("march", self.march, marching)
+                self.run_stage("compact", next_marching.compact, marching, self.marching)
+                marching, next_marching = next_marching, marching
+                if marching.length[None] == 0:
+                    break
+
+            self.run_stage("shade", self.shade, paths, depth)
+            self.run_stage("compact", next_paths.compact, paths, self.alive)
+            paths, next_paths = next_paths, paths
+        self.run_stage("accumulate", self.accumulate)
+
+    def get_report(self) -> str:
+        """
+        Time spent in every stage and march steps per ray since the last call, needs report=True
+        """
+        total = sum(self.timing.values())
+        text = ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in self.timing.items())
+        for name in self.timing:
+            self.timing[name] = 0.0
+        steps = self.num_march_step[None] / max(self.num_segment[None], 1)
+        self.num_march_step[None] = 0
+        self.num_segment[None] = 0
+        return f"{text} (total {total * 1000:.1f} ms), {steps:.1f} march steps per ray"
+
+    def write_trace(self, path: str):
+        """
+        Write every stage launch timed so far in the Chrome trace event format (chrome://tracing or
+        https://ui.perfetto.dev), needs report=True
+        """
+        trace = [{"name": name, "cat": "stage", "ph": "X", "ts": 1e6 * start, "dur": 1e6 * duration, "pid": 0, "tid": 0}
+                 for name, start, duration in self.events]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, file)
@@ -1,7 +1,6 @@
 import taichi as ti
 import taichi.math as tm
 
-from Scene import Scene
 from Object import Object
 
 PRECISION = 0.0001
@@ -9,13 +8,21 @@ MAX_RAYMARCHING = 512
 MIN_TIME = 0.1
 MAX_TIME = 2000.0
 
+# over-relaxed sphere tracing, steps are RELAXATION times the distance until two steps overshoot, 1 disables it
+RELAXATION = 1.3
+# hit precision grows with the distance along the ray, roughly the footprint of a pixel
+PRECISION_SLOPE = 0.0005
+
 
 @ti.dataclass
 class RayHitRecord:
     position:   tm.vec3
     time:       float
     hit:        bool
+    finished:   bool    # hit a surface or escaped the scene, marching it further is useless
+    hit_index:  int
     hit_object: Object
+    num_step:   int     # number of SDF evaluations, for statistics
 
 
 @ti.dataclass
@@ -29,23 +36,48 @@ class Ray:
         return self.position + self.direction * time
 
     @ti.func
-    def raycast(self, scene: Scene) -> RayHitRecord:
-        record = RayHitRecord(position=self.position, time=MIN_TIME, hit=False)
-
-        for _ in range(MAX_RAYMARCHING):
-            record.position = self.at(record.time)
-            nearest_object, dist = scene.get_nearest_object(record.position)
-
-            if dist < PRECISION:
-                record.hit = True
-                record.hit_object = nearest_object
-                break
-            record.time += dist
-            if dist > MAX_TIME:
-                break
-        return record
-
-
-
+    def march(self, scene: ti.template(), record: RayHitRecord, num_step: int) -> RayHitRecord:
+        """
+        Continue marching the ray from record.time for at most num_step steps.
+        The distance is taken in absolute value so rays that start inside an object (refracted by a
+        dielectric) march to the surface they leave from.
+        Steps are over-relaxed (Keinert et al. 2014, Enhanced Sphere Tracing): when the unbounding spheres of two
+        consecutive points do not overlap the relaxed step may have skipped a surface, the ray goes back to the
+        previous point plus its plain step and marches without relaxation from there
+        """
+        result = record
+        omega = RELAXATION
+        previous_time = result.time
+        previous_dist = 0.0
+        step = 0.0
+        for _ in range(num_step):
+            result.position = self.at(result.time)
+            nearest_index, dist = scene.get_nearest_object(result.position)
+            dist = abs(dist)
+            result.num_step += 1
 
+            if omega > 1 and dist + previous_dist < step:
+                omega = 1.0
+                step = previous_dist
+                result.time = previous_time + previous_dist
+            else:
+                if dist < max(PRECISION, PRECISION_SLOPE * result.time):
+                    result.hit = True
+                    result.finished = True
+                    result.hit_index = nearest_index
+                    result.hit_object = scene.objects[nearest_index]
+                    break
+                previous_time = result.time
+                previous_dist = dist
+                step = omega * dist
+                result.time += step
+                if dist > MAX_TIME or result.time > MAX_TIME:
+                    result.finished = True
+                    break
+        return result
 
+    @ti.func
+    def raycast(self, scene: ti.template(), min_time: float = MIN_TIME) -> RayHitRecord:
+        record = RayHitRecord(position=self.position, time=min_time, hit=False, finished=False, hit_index=-1,
+                              num_step=0)
+        return self.march(scene, record, MAX_RAYMARCHING)
@@ -0,0 +1,63 @@
+import taichi as ti
+
+SCAN_BLOCK = 1024   # slots scanned per block by the first pass of the prefix sum
+
+
+@ti.data_oriented
+class RayQueue:
+    """
+    List of ray (pixel) indices processed by one wavefront stage, items[0:length] are valid
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.items = ti.field(dtype=ti.i32, shape=capacity)
+        self.length = ti.field(dtype=ti.i32, shape=())
+        # prefix sum buffers of compact()
+        self.offset = ti.field(dtype=ti.i32, shape=capacity)
+        self.block_sum = ti.field(dtype=ti.i32, shape=(capacity + SCAN_BLOCK - 1) // SCAN_BLOCK)
+
+    @ti.kernel
+    def fill(self):
+        """
+        Enqueue every ray index in order
+        """
+        for q in self.items:
+            self.items[q] = q
+        self.length[None] = self.capacity
+
+    @ti.kernel
+    def compact(self, source: ti.template(), keep: ti.template()):
+        """
+        Replace the queue by the rays of source whose keep flag is set, in the same order.
+        The exclusive prefix sum of the flags gives every kept ray its slot, it is scanned per block
+        then offset by the block sums
+        :param source: another RayQueue
+        :param keep: field of flag indexed by ray index
+        """
+        n = source.length[None]
+        num_block = (n + SCAN_BLOCK - 1) // SCAN_BLOCK
+        for b in range(num_block):
+            total = 0
+            for q in range(b * SCAN_BLOCK, min((b + 1) * SCAN_BLOCK, n)):
+                self.offset[q] = total
+                if keep[source.items[q]]:
+                    total += 1
+            self.block_sum[b] = total
+
+        ti.loop_config(serialize=True)
+        for b in range(1, num_block):
+            self.block_sum[b] += self.block_sum[b - 1]
+
+        for q in range(n):
+            ray = source.items[q]
+            if keep[ray]:
+                b = q // SCAN_BLOCK
+                base = 0
+                if b > 0:
+                    base = self.block_sum[b - 1]
+                self.items[base + self.offset[q]] = ray
+
+        self.length[None] = 0
+        if num_block > 0:
+            self.length[None] = self.block_sum[num_block - 1]
@@ -0,0 +1,42 @@
+import taichi as ti
+import taichi.math as tm
+
+from AdaptiveSampler import AdaptiveSampler
+from Camera import Camera
+from Film import Film
+
+
+@ti.data_oriented
+class Renderer:
+    """
+    Shade the scene into the film, one jittered sample per pixel and call.
+    With an AdaptiveSampler only the pixels of its active tiles are sampled
+    """
+
+    def __init__(self, scene, film: Film, sampler: AdaptiveSampler = None):
+        self.scene = scene
+        self.film = film
+        self.sampler = sampler
+        self.use_sampler = sampler is not None
+
+    @ti.kernel
+    def render(self, camera: Camera):
+        resolution = ti.static(self.film.resolution)
+        for i, j in self.film.image:
+            if ti.static(self.use_sampler):
+                if not self.sampler.is_active(i, j):
+                    continue
+            # jitter inside the pixel, the accumulated samples also anti-alias the edges
+            u = (i + ti.random()) / resolution[0]
+            v = (j + ti.random()) / resolution[1]
+
+            ray = camera.get_ray(u, v, tm.vec4(1.0))
+            record = ray.raycast(scene=self.scene)
+
+            if record.hit:
+                ray.color.rgb = 0.5 + 0.5 * self.scene.get_normal(record.hit_index, record.position)
+                ray.color.rgb *= record.hit_object.material.albedo
+            else:
+                ray.color.rgb = tm.vec3(0.0, 0.0, 1.0)
+
+            self.film.add_sample(i, j, ray.color.rgb)
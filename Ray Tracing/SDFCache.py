@@ -0,0 +1,105 @@
+import numpy as np
+import taichi as ti
+import taichi.math as tm
+
+BLOCK_SIZE = 8           # fine voxels per pointer block along each axis
+MAX_VOXELS = 1 << 30     # fine voxels addressed by the sparse grid, its memory is reserved up front
+SQRT3 = 1.7320508
+
+
+@ti.data_oriented
+class SDFCache:
+    """
+    Baked distance field of the static scene used to step rays in empty space.
+    A dense coarse grid keeps the distance at the center of every block, blocks intersecting the narrow band
+    around the surfaces are activated and keep the distance at their fine voxel corners, the fine voxels
+    themselves are only activated inside the band. Every lookup is a lower bound of the exact distance,
+    the scene evaluates the exact SDF once the bound drops below near_distance
+    """
+
+    def __init__(self, lower: np.ndarray, upper: np.ndarray, voxel_size: float, band: float = 0.0):
+        """
+        :param lower: lower corner of the cached region
+        :param upper: upper corner of the cached region
+        :param voxel_size: edge length of a fine voxel
+        :param band: width of the band around surfaces stored at fine resolution, defaults to 4 voxels
+        """
+        self.voxel_size = voxel_size
+        self.band = band if band > 0 else 4 * voxel_size
+        # trilinear interpolation of a distance field is off by at most the voxel diagonal
+        self.margin = SQRT3 * voxel_size
+        self.near_distance = 2 * self.margin
+        self.block_radius = SQRT3 * 0.5 * (BLOCK_SIZE + 1) * voxel_size
+
+        # keep the whole band inside the cached region
+        lower = np.asarray(lower, dtype=np.float32) - (self.band + self.margin)
+        upper = np.asarray(upper, dtype=np.float32) + (self.band + self.margin)
+
+        self.num_block = tuple(int(k) for k in np.ceil((upper - lower) / (voxel_size * BLOCK_SIZE)).astype(int) + 1)
+        self.resolution = tuple(k * BLOCK_SIZE for k in self.num_block)
+        if np.prod(self.resolution, dtype=np.float64) > MAX_VOXELS:
+            raise ValueError(f"SDF cache of {upper - lower} at voxel size {voxel_size} needs "
+                             f"{'x'.join(map(str, self.resolution))} voxels, more than {MAX_VOXELS}. "
+                             f"Use a larger voxel size")
+        self.origin = tm.vec3(*lower.tolist())
+
+        self.coarse = ti.field(dtype=float, shape=self.num_block)
+        self.distance = ti.field(dtype=float)
+        self.block = ti.root.pointer(ti.ijk, self.num_block)
+        self.voxel = self.block.bitmasked(ti.ijk, BLOCK_SIZE)
+        self.voxel.place(self.distance)
+
+    @ti.kernel
+    def bake(self, scene: ti.template()):
+        """
+        Evaluate the exact SDF at every block center and at the voxel corners of the blocks near a surface
+        """
+        h = ti.static(self.voxel_size)
+        for b in ti.grouped(self.coarse):
+            center = self.origin + (b * BLOCK_SIZE + 0.5 * (BLOCK_SIZE - 1)) * h
+            nearest, dist = scene.bvh.get_nearest(center, scene, scene.max_distance)
+            self.coarse[b] = dist
+            if abs(dist) < self.band + self.margin + self.block_radius:
+                for k in ti.grouped(ti.ndrange(BLOCK_SIZE, BLOCK_SIZE, BLOCK_SIZE)):
+                    I = b * BLOCK_SIZE + k
+                    # nothing beyond the band is stored, skip the far BVH nodes
+                    nearest, voxel_dist = scene.bvh.get_nearest(self.origin + I * h, scene,
+                                                                self.band + self.margin)
+                    if abs(voxel_dist) < self.band + self.margin:
+                        self.distance[I] = voxel_dist
+
+    def rebuild(self, scene):
+        """
+        Drop the band and bake it again from the current object transforms
+        """
+        self.block.deactivate_all()
+        self.bake(scene)
+
+    @ti.func
+    def get_distance_bound(self, p: tm.vec3) -> float:
+        """
+        Lower bound of the distance from p to the scene, -1 when p is outside the cached region.
+        Rays never go deep inside an object, a voxel missing from the band is assumed to be outside
+        """
+        bound = -1.0
+        g = (p - self.origin) / self.voxel_size
+        base = ti.floor(g, int)
+        if (base >= 0).all() and (base < tm.ivec3(self.resolution) - 1).all():
+            b = base // BLOCK_SIZE
+            bound = self.coarse[b] - self.block_radius
+
+            all_active = True
+            for k in ti.static(ti.grouped(ti.ndrange(2, 2, 2))):
+                if not ti.is_active(self.voxel, base + k):
+                    all_active = False
+            if all_active:
+                f = g - base
+                value = 0.0
+                for k in ti.static(ti.grouped(ti.ndrange(2, 2, 2))):
+                    w = k * f + (1 - k) * (1 - f)
+                    value += w.x * w.y * w.z * self.distance[base + k]
+                bound = max(bound, value - self.margin)
+            else:
+                # a corner outside the band is at least band + margin away
+                bound = max(bound, self.band)
+        return bound
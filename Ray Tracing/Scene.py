@@ -1,36 +1,268 @@
+import json
+
+import numpy as np
 import taichi as ti
 import taichi.math as tm
 
 import Object
+from BVH import BVH
+from Mesh import MeshTable
+from SDFCache import SDFCache
+
+MAX_DISTANCE = 5000.0
 
-@ti.dataclass
+
+@ti.data_oriented
 class Scene:
-    num_object: int
-    objects: ti.field(dtype=Object.Object)
+    """
+    Objects of the scene and the BVH over their bounds, built once from a list of Object or from the struct of
+    arrays of Object.new_table, which the object field loads in one from_numpy.
+    With a positive voxel_size the distance field of the scene is also baked into an SDFCache over the bounds of
+    its finite objects.
+    Mesh objects instance the meshes of a MeshTable, built here.
+    Only the shape types present in the scene are compiled into the distance and normal evaluation
+    """
+
+    def __init__(self, objects, voxel_size: float = 0.0, meshes: MeshTable = None):
+        """
+        :param objects: list of Object or table of Object.new_table
+        """
+        self.table = objects if isinstance(objects, dict) else Object.pack(objects)
+        self.num_object = len(self.table["type"])
+        self.max_distance = MAX_DISTANCE
+        self.shapes = tuple(sorted(set(self.table["type"].tolist())))
+        self.meshes = meshes if meshes is not None else MeshTable()
+        self.use_mesh = Object.SHAPE_MESH in self.shapes
+        self.meshes.build()
+        self.objects = Object.Object.field(shape=max(self.num_object, 1))
+        if self.num_object > 0:
+            self.objects.from_numpy(self.table)
+
+        lower, upper = self.get_bounds()
+        self.bvh = BVH(lower, upper)
+
+        # the cache only covers the finite objects, an unbounded one is still baked into the field within that
+        # region and rays leaving it query the BVH
+        self.cache = None
+        bounded = ~np.isin(self.table["type"], Object.UNBOUNDED_SHAPES)
+        self.use_cache = voxel_size > 0 and bool(bounded.any())
+        if self.use_cache:
+            self.cache = SDFCache(lower[bounded].min(axis=0), upper[bounded].max(axis=0), voxel_size)
+            self.cache.rebuild(self)
+        self.dirty = False
+
+    def get_bounds(self) -> (np.ndarray, np.ndarray):
+        lower, upper = Object.get_bounds(self.table, self.meshes.bounds)
+        return lower.astype(np.float32), upper.astype(np.float32)
 
-    def __init__(self):
-        self.objects = ti.field(Object.Object, shape=self.num_object)
+    def set_transform(self, index: int, transform: Object.Transform):
+        """
+        Move an object, the object field, the BVH and the SDF cache are updated by the next update()
+        """
+        Object.set_row(self.table["transform"], index, transform)
+        self.dirty = True
+
+    def update(self):
+        """
+        Upload the moved objects and rebuild the acceleration structures if any transform changed since the last call
+        """
+        if not self.dirty:
+            return
+        self.objects.from_numpy(self.table)
+        self.bvh.rebuild(*self.get_bounds())
+        if self.use_cache:
+            self.cache.rebuild(self)
+        self.dirty = False
+
+    @ti.func
+    def get_object_distance(self, index: int, p: tm.vec3) -> float:
+        """
+        Signed distance from p to the object, a mesh is the shell of its triangles and has no inside
+        """
+        obj = self.objects[index]
+        dist = 0.0
+        if ti.static(self.use_mesh) and obj.type == Object.SHAPE_MESH:
+            local = obj.transform.to_local(p)
+            closest = self.meshes.get_closest_point(obj.mesh, local)
+            dist = (tm.length(local - closest) - obj.params.x) * obj.transform.get_min_scale()
+        else:
+            dist = obj.get_signed_distance(p, ti.static(self.shapes))
+        return dist
 
     @ti.func
-    def get_nearest_object(self, p: tm.vec3) -> (Object.Object, float):
-        dist = 5000
-        nearest_object = Object.Object()
-        for i in self.objects:
-            curr_dist = self.objects[i].get_signed_distance(p)
-            if curr_dist < dist:
-                dist = curr_dist
-                nearest_object = self.objects[i]
-        return nearest_object, dist
-
-
-def init_base_scene() -> Scene:
-    scene = Scene(num_object = 2)
-    scene.objects[0] = Object.Object(params=0.5,
-                                     type=Object.SHAPE_SPHERE,
-                                     transform=Object.Transform(position=tm.vec3(0, 0, -1)),
-                                     material=Object.Material(albedo=tm.vec3(1, 0, 0)))
-    scene.objects[1] = Object.Object(params=0.5,
-                                     type=Object.SHAPE_CUBE,
-                                     transform=Object.Transform(position=tm.vec3(1, 0, -1)),
-                                     material=Object.Material(albedo=tm.vec3(0, 1, 0)))
-    return scene
+    def get_normal(self, index: int, p: tm.vec3) -> tm.vec3:
+        """
+        Outward normal of the object at p, analytic for every shape
+        """
+        obj = self.objects[index]
+        normal = tm.vec3(0.0)
+        if ti.static(self.use_mesh) and obj.type == Object.SHAPE_MESH:
+            local = obj.transform.to_local(p)
+            normal = obj.transform.normal_to_world(local - self.meshes.get_closest_point(obj.mesh, local))
+        else:
+            normal = obj.get_normal(p, ti.static(self.shapes))
+        return normal
+
+    @ti.func
+    def get_nearest_object(self, p: tm.vec3):
+        """
+        :return: index of the nearest object to p and its signed distance. Far from every surface the index
+        is -1 and the distance a lower bound read from the SDF cache
+        """
+        nearest = -1
+        dist = -1.0
+        near_distance = 0.0
+        if ti.static(self.use_cache):
+            dist = self.cache.get_distance_bound(p)
+            near_distance = self.cache.near_distance
+        if dist < near_distance:
+            nearest, dist = self.bvh.get_nearest(p, self, self.max_distance)
+        return nearest, dist
+
+
+def read_scene_file(path: str) -> dict:
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise RuntimeError("reading .yaml scenes requires the PyYAML package, pip install pyyaml") from None
+        with open(path) as file:
+            return yaml.safe_load(file)
+    with open(path) as file:
+        return json.load(file)
+
+
+def load_scene(path: str, voxel_size: float = 0.0) -> Scene:
+    """
+    Load a scene description, .json or .yaml (needs PyYAML), e.g.
+    {"meshes": {"pyramid": {"vertices": [[x, y, z], ...], "faces": [[0, 1, 2], ...]}},
+     "materials": {"red": {"albedo": [1, 0, 0]}, "glass": {"type": "dielectric", "ior": 1.5}},
+     "objects": [{"shape": "sphere", "params": [0.5], "position": [0, 0, -1], "material": "red"},
+                 {"shape": "mesh", "mesh": "pyramid", "rotation": [0, 0, 0, 1], "scale": [1, 2, 1],
+                  "material": {"albedo": [0, 1, 0], "type": "metal", "roughness": 0.1}}]}
+    Every object gets a shape, its other keys default to zero, materials are named or inline.
+    The columns of the object table are filled on the host and uploaded at once
+    """
+    description = read_scene_file(path)
+    meshes = MeshTable()
+    mesh_index = {name: meshes.add(mesh["vertices"], mesh["faces"])
+                  for name, mesh in description.get("meshes", {}).items()}
+    materials = description.get("materials", {})
+    objects = description.get("objects", [])
+
+    table = Object.new_table(len(objects))
+    material = table["material"]
+    for i, obj in enumerate(objects):
+        table["type"][i] = Object.SHAPE_NAMES[obj["shape"]]
+        params = obj.get("params", [])
+        table["params"][i, :len(params)] = params
+        if obj["shape"] == "mesh":
+            table["mesh"][i] = mesh_index[obj["mesh"]]
+        for key in ("position", "rotation", "scale"):
+            if key in obj:
+                table["transform"][key][i] = obj[key]
+
+        properties = obj.get("material", {})
+        if isinstance(properties, str):
+            properties = materials[properties]
+        material["type"][i] = Object.MATERIAL_NAMES[properties.get("type", "diffuse")]
+        for key in ("albedo", "emission", "roughness", "ior"):
+            if key in properties:
+                material[key][i] = properties[key]
+    return Scene(table, voxel_size, meshes)
+
+
+def init_base_scene(voxel_size: float = 0.0) -> Scene:
+    return Scene([
+        Object.Object(params=tm.vec2(0.5, 0),
+                      type=Object.SHAPE_SPHERE,
+                      transform=Object.Transform(position=tm.vec3(0, 0, -1)),
+                      material=Object.Material(albedo=tm.vec3(1, 0, 0))),
+        Object.Object(params=tm.vec2(0.5, 0),
+                      type=Object.SHAPE_CUBE,
+                      transform=Object.Transform(position=tm.vec3(1, 0, -1)),
+                      material=Object.Material(albedo=tm.vec3(0, 1, 0))),
+    ], voxel_size)
+
+
+def init_material_scene(voxel_size: float = 0.0) -> Scene:
+    """
+    Diffuse, metal and glass spheres on a diffuse ground under a spherical light, for the PathTracer
+    """
+    return Scene([
+        Object.Object(params=tm.vec2(100, 0),
+                      type=Object.SHAPE_CUBE,
+                      transform=Object.Transform(position=tm.vec3(0, -100.5, -1)),
+                      material=Object.Material(albedo=tm.vec3(0.8, 0.8, 0.8))),
+        Object.Object(params=tm.vec2(0.5, 0),
+                      type=Object.SHAPE_SPHERE,
+                      transform=Object.Transform(position=tm.vec3(0, 0, -1)),
+                      material=Object.Material(albedo=tm.vec3(0.8, 0.2, 0.2))),
+        Object.Object(params=tm.vec2(0.5, 0),
+                      type=Object.SHAPE_SPHERE,
+                      transform=Object.Transform(position=tm.vec3(1, 0, -1)),
+                      material=Object.Material(albedo=tm.vec3(0.9, 0.8, 0.6),
+                                               type=Object.MATERIAL_METAL, roughness=0.1)),
+        Object.Object(params=tm.vec2(0.5, 0),
+                      type=Object.SHAPE_SPHERE,
+                      transform=Object.Transform(position=tm.vec3(-1, 0, -1)),
+                      material=Object.Material(albedo=tm.vec3(1.0), type=Object.MATERIAL_DIELECTRIC, ior=1.5)),
+        Object.Object(params=tm.vec2(0.3, 0),
+                      type=Object.SHAPE_SPHERE,
+                      transform=Object.Transform(position=tm.vec3(0, 1.5, -0.5)),
+                      material=Object.Material(emission=tm.vec3(10.0))),
+    ], voxel_size)
+
+
+def init_random_scene(num_object: int, seed: int = 0, voxel_size: float = 0.0) -> Scene:
+    """
+    Small spheres and cubes scattered on a plane behind the base scene, to stress the BVH
+    """
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(num_object)))
+    objects = []
+    for k in range(num_object):
+        position = tm.vec3(k % side - 0.5 * side, rng.uniform(-1, 1), -2 - k // side)
+        objects.append(Object.Object(params=tm.vec2(rng.uniform(0.1, 0.4), 0),
+                                     type=Object.SHAPE_SPHERE if k % 2 == 0 else Object.SHAPE_CUBE,
+                                     transform=Object.Transform(position=position),
+                                     material=Object.Material(albedo=tm.vec3(rng.uniform(0, 1, 3)))))
+    return Scene(objects, voxel_size)
+
+
+def init_instance_scene(side: int = 8, seed: int = 0, voxel_size: float = 0.0) -> Scene:
+    """
+    One octahedron mesh instanced side * side times with random rotation and scale, next to a torus and a
+    capsule on a ground plane. Every instance only adds an Object, the triangles are stored once
+    """
+    rng = np.random.default_rng(seed)
+    meshes = MeshTable()
+    octahedron = meshes.add(np.array([[1, 0, 0], [-1, 0, 0], [0, 1, 0], [0, -1, 0], [0, 0, 1], [0, 0, -1]]),
+                            np.array([[0, 2, 4], [2, 1, 4], [1, 3, 4], [3, 0, 4],
+                                      [2, 0, 5], [1, 2, 5], [3, 1, 5], [0, 3, 5]]))
+    objects = [
+        Object.Object(type=Object.SHAPE_PLANE,
+                      transform=Object.Transform(position=tm.vec3(0, -0.5, 0)),
+                      material=Object.Material(albedo=tm.vec3(0.8, 0.8, 0.8))),
+        Object.Object(params=tm.vec2(0.4, 0.1),
+                      type=Object.SHAPE_TORUS,
+                      transform=Object.Transform(position=tm.vec3(-1, 0, -1),
+                                                 rotation=tm.vec4(np.sin(0.5), 0, 0, np.cos(0.5))),
+                      material=Object.Material(albedo=tm.vec3(0.2, 0.4, 0.9))),
+        Object.Object(params=tm.vec2(0.3, 0.2),
+                      type=Object.SHAPE_CAPSULE,
+                      transform=Object.Transform(position=tm.vec3(1, 0, -1), scale=tm.vec3(1, 1, 0.5)),
+                      material=Object.Material(albedo=tm.vec3(0.9, 0.5, 0.1))),
+    ]
+    for k in range(side * side):
+        position = tm.vec3(k % side - 0.5 * (side - 1), 0, -2 - k // side)
+        axis = rng.normal(size=3)
+        angle = rng.uniform(0, np.pi)
+        rotation = np.append(axis / np.linalg.norm(axis) * np.sin(angle), np.cos(angle))
+        objects.append(Object.Object(params=tm.vec2(0.02, 0),
+                                     type=Object.SHAPE_MESH,
+                                     mesh=octahedron,
+                                     transform=Object.Transform(position=position, rotation=tm.vec4(rotation),
+                                                                scale=tm.vec3(rng.uniform(0.2, 0.4, 3))),
+                                     material=Object.Material(albedo=tm.vec3(rng.uniform(0, 1, 3)))))
+    return Scene(objects, voxel_size, meshes)
@@ -1,12 +1,10 @@
 import taichi as ti
 import taichi.math as tm
-import time
 
-# from Scene import init_base_scene
-from Object import Object, Transform, Material
+from Scene import init_base_scene
 from Camera import Camera
-
-NUM_OBJECT = 2
+from Film import Film
+from Renderer import Renderer
 
 
 ti.init(arch=ti.vulkan)
@@ -14,7 +12,7 @@ ti.init(arch=ti.vulkan)
 # initialize the window and camera
 image_resolution = (640, 480)
 aspect_ratio = image_resolution[0] / image_resolution[1]
-image_pixels = ti.Vector.field(3, ti.float32, image_resolution)
+film = Film(image_resolution)
 
 camera = Camera(position=tm.vec3(0, 0, 4),
                 lookat=tm.vec3(0, 0, 2),
@@ -24,43 +22,22 @@ camera = Camera(position=tm.vec3(0, 0, 4),
                 aperture=0.01,
                 focus=4)
 
-# initialize the scene object
-scene_objects = Object.field(shape=NUM_OBJECT)
-scene_objects[0] = Object.Object(params=0.5,
-                                 type=Object.SHAPE_SPHERE,
-                                 transform=Object.Transform(position=tm.vec3(0, 0, -1)),
-                                 material=Object.Material(albedo=tm.vec3(1, 0, 0)))
-scene_objects[1] = Object.Object(params=0.5,
-                                 type=Object.SHAPE_CUBE,
-                                 transform=Object.Transform(position=tm.vec3(1, 0, -1)),
-                                 material=Object.Material(albedo=tm.vec3(0, 1, 0)))
-
-
-@ti.kernel
-def render(delta_time: float, render_camera: Camera):
-    for i, j in image_pixels:
-        u = i / image_resolution[0]
-        v = j / image_resolution[1]
+# initialize the scene object, init_random_scene(num_object) builds a larger one,
+# a positive voxel_size also bakes the distance field of the static objects into an SDFCache
+scene = init_base_scene()
 
-        ray = render_camera.get_ray(u, v, tm.vec4(1.0))
-        record = ray.raycast(scene=scene)
-
-        if record.hit:
-            ray.color.rgb = 0.5 + 0.5 * record.hit_object.get_normal(record.position)
-            ray.color.rgb *= record.hit_object.material.albedo
-        else:
-            ray.color.rgb = tm.vec3(0.0, 0.0, 1.0)
-
-        image_pixels[i, j] = ray.color.rgb
+# normal shading of the first hit, PathTracer(scene, film) renders the light transport
+# e.g. of init_material_scene() instead
+renderer = Renderer(scene, film)
 
 
 window = ti.ui.Window("Taichi Renderer", image_resolution)
 canvas = window.get_canvas()
 
-start_time = time.time()
 while window.running:
     window.get_event()
 
+    camera_moved = True
     if window.is_pressed('a'):
         camera.position += tm.vec3(0.05, 0, 0)
     elif window.is_pressed('d'):
@@ -73,7 +50,14 @@ while window.running:
         camera.position += tm.vec3(0, -0.05, 0)
     elif window.is_pressed('e'):
         camera.position += tm.vec3(0, 0.05, 0)
+    else:
+        camera_moved = False
+
+    # any camera move or scene change restarts the accumulation, a still view keeps converging
+    if camera_moved or scene.dirty:
+        scene.update()
+        film.reset()
 
-    render(time.time() - start_time, camera)
-    canvas.set_image(image_pixels)
+    renderer.render(camera)
+    canvas.set_image(film.image)
     window.show()
\ No newline at end of file
@@ -0,0 +1,186 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import taichi as ti
+import taichi.math as tm
+
+from AdaptiveSampler import AdaptiveSampler
+from Camera import Camera
+from Film import Film
+from PathTracer import PathTracer
+from Renderer import Renderer
+from Scene import init_base_scene, init_instance_scene, init_material_scene, init_random_scene, load_scene
+
+"""
+Render a camera path without window, e.g. on render farm nodes
+python3 offline.py --frames 24 --spp 64 --output frames/frame_%04d.png
+"""
+arch_table = {
+    "cpu": ti.cpu,
+    "vulkan": ti.vulkan,
+    "auto": ti.gpu,     # taichi falls back to cpu when no gpu backend is found
+}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline SDF ray marching renderer")
+    parser.add_argument("--arch", choices=arch_table.keys(), default="cpu",
+                        help="taichi backend used to render")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="max number of cpu threads, default to all cores")
+    parser.add_argument("--resolution", type=int, nargs=2, default=(640, 480), metavar=("WIDTH", "HEIGHT"),
+                        help="image resolution in pixels")
+    parser.add_argument("--spp", type=int, default=16,
+                        help="samples per pixel of every frame")
+    parser.add_argument("--frames", type=int, default=1,
+                        help="number of frames along the camera path")
+    parser.add_argument("--camera-start", type=float, nargs=3, default=(0, 0, 4), metavar=("X", "Y", "Z"),
+                        help="camera position of the first frame")
+    parser.add_argument("--camera-end", type=float, nargs=3, default=None, metavar=("X", "Y", "Z"),
+                        help="camera position of the last frame, the camera stays still when not given")
+    parser.add_argument("--lookat", type=float, nargs=3, default=(0, 0, 2), metavar=("X", "Y", "Z"),
+                        help="point the camera looks at")
+    parser.add_argument("--aperture", type=float, default=0.01,
+                        help="lens diameter, 0 for a pinhole camera")
+    parser.add_argument("--focus", type=float, default=4,
+                        help="distance from the camera to the plane in focus")
+    parser.add_argument("--scene", choices=("base", "material", "instance"), default="base",
+                        help="scene to render, material has a light and every kind of material, "
+                             "instance has every shape and a mesh instanced many times")
+    parser.add_argument("--scene-file", type=str, default=None,
+                        help="load a .json or .yaml scene description instead of --scene, see Scene.load_scene")
+    parser.add_argument("--num-object", type=int, default=0,
+                        help="render init_random_scene(num_object) instead of --scene")
+    parser.add_argument("--integrator", choices=("normal", "path"), default="normal",
+                        help="normal shading of the first hit or full path tracing")
+    parser.add_argument("--max-bounce", type=int, default=8,
+                        help="max path length of the path integrator")
+    parser.add_argument("--stage-timing", action="store_true",
+                        help="print the time of every wavefront stage of the path integrator and the march steps "
+                             "per ray")
+    parser.add_argument("--trace", type=str, default=None,
+                        help="with --stage-timing, write every stage launch to this Chrome trace .json")
+    parser.add_argument("--adaptive", type=float, default=0.0, metavar="THRESHOLD",
+                        help="stop sampling the tiles whose relative error is under THRESHOLD, --spp is then "
+                             "the max number of samples per pixel")
+    parser.add_argument("--min-spp", type=int, default=8,
+                        help="samples per pixel before a tile can stop, with --adaptive")
+    parser.add_argument("--voxel-size", type=float, default=0.0,
+                        help="bake the scene into an SDFCache of this voxel size")
+    parser.add_argument("--output", type=str, default="frame_%04d.png",
+                        help="output path pattern formatted with the frame index, .png or .exr")
+    return parser.parse_args()
+
+
+def check_output(path: str):
+    """
+    Fail before rendering when the output format can not be written
+    """
+    if path.endswith(".exr"):
+        try:
+            import OpenEXR
+            import Imath
+        except ImportError:
+            raise RuntimeError("writing .exr requires the OpenEXR package, pip install OpenEXR") from None
+    elif not path.endswith(".png"):
+        raise ValueError(f"output {path} should end with .png or .exr")
+
+
+def write_image(path: str, image: np.ndarray):
+    """
+    Write a (width, height, 3) float image, .exr keeps the linear values and needs the OpenEXR package
+    """
+    if path.endswith(".exr"):
+        import OpenEXR
+        import Imath
+        # taichi image is indexed [x, y] from the bottom row, exr is stored row by row from the top
+        pixels = np.ascontiguousarray(np.flip(image.transpose(1, 0, 2), axis=0), dtype=np.float32)
+        header = OpenEXR.Header(image.shape[0], image.shape[1])
+        header["channels"] = {c: Imath.Channel(Imath.PixelType(Imath.PixelType.FLOAT)) for c in "RGB"}
+        exr = OpenEXR.OutputFile(path, header)
+        exr.writePixels({c: pixels[..., k].tobytes() for k, c in enumerate("RGB")})
+        exr.close()
+    else:
+        ti.tools.imwrite(np.clip(image, 0, 1), path)
+
+
+def main():
+    args = parse_args()
+    check_output(args.output)
+    if args.threads is not None:
+        ti.init(arch=arch_table[args.arch], cpu_max_num_threads=args.threads)
+    else:
+        ti.init(arch=arch_table[args.arch])
+
+    resolution = tuple(args.resolution)
+    film = Film(resolution)
+    if args.scene_file is not None:
+        scene = load_scene(args.scene_file, args.voxel_size)
+    elif args.num_object > 0:
+        scene = init_random_scene(args.num_object, voxel_size=args.voxel_size)
+    elif args.scene == "material":
+        scene = init_material_scene(args.voxel_size)
+    elif args.scene == "instance":
+        scene = init_instance_scene(voxel_size=args.voxel_size)
+    else:
+        scene = init_base_scene(args.voxel_size)
+    sampler = AdaptiveSampler(film, args.adaptive, args.min_spp) if args.adaptive > 0 else None
+    if args.integrator == "path":
+        renderer = PathTracer(scene, film, max_bounce=args.max_bounce, report=args.stage_timing, sampler=sampler)
+    else:
+        renderer = Renderer(scene, film, sampler)
+
+    start = np.array(args.camera_start, dtype=np.float32)
+    end = np.array(args.camera_end if args.camera_end is not None else args.camera_start, dtype=np.float32)
+    folder = os.path.dirname(args.output)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    total_time = 0.0
+    total_samples = 0
+    for frame in range(args.frames):
+        t = frame / max(args.frames - 1, 1)
+        camera = Camera(position=tm.vec3(*((1 - t) * start + t * end)),
+                        lookat=tm.vec3(*args.lookat),
+                        up=tm.vec3(0, 1, 0),
+                        vertical_fov=30,
+                        aspect_ratio=resolution[0] / resolution[1],
+                        aperture=args.aperture,
+                        focus=args.focus)
+
+        frame_start = time.perf_counter()
+        film.reset()
+        if sampler is not None:
+            sampler.reset()
+        for sample in range(args.spp):
+            renderer.render(camera)
+            if sampler is not None and sample + 1 >= args.min_spp and sampler.update() == 0:
+                break
+        image = film.image.to_numpy()
+        frame_time = time.perf_counter() - frame_start
+        total_time += frame_time
+
+        path = args.output % frame if "%" in args.output else args.output
+        write_image(path, image)
+        rays = int(film.sample_count.to_numpy().sum())
+        total_samples += rays
+        print(f"frame {frame}: {frame_time * 1000:.1f} ms, {rays / frame_time / 1e6:.2f} Mrays/s -> {path}")
+        if sampler is not None:
+            stats = sampler.get_stats()
+            print(f"    {stats['num_tile'] - stats['num_active']}/{stats['num_tile']} tiles converged, "
+                  f"samples per tile min {stats['min_samples']} mean {stats['mean_samples']:.0f} "
+                  f"max {stats['max_samples']}, {rays / (resolution[0] * resolution[1]):.1f} spp on average")
+        if args.integrator == "path" and args.stage_timing:
+            print(f"    {renderer.get_report()}")
+
+    if args.integrator == "path" and args.stage_timing and args.trace is not None:
+        renderer.write_trace(args.trace)
+        print(f"trace written to {args.trace}")
+    print(f"{args.frames} frames in {total_time:.2f} s, {total_samples / total_time / 1e6:.2f} Mrays/s "
+          f"(first frame includes compile time)")
+
+
+if __name__ == "__main__":
+    main()